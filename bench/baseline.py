@@ -0,0 +1,158 @@
+# the code paths replaced by the optimizations - the "before" of the benchmarks
+#
+# The functions are copies of the former code of the application; only the
+# data source is passed in (no download) and the logging is removed.
+import io
+import csv
+import base64
+from datetime import datetime
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+
+# ---------------------------------------------------------------------------
+def get_data(lines, country, timespan_days):
+    """ The former "covid19_main.get_data": parse the CSV lines for each request """
+    now = datetime.now()
+    start_date = np.datetime64('%4d-%02d-%02d' %(now.year,now.month,now.day) ) - timespan_days
+
+    country_list, list_date, list_registered, list_ill, list_dead, list_recovered = [ [],[],[],[],[], [] ]
+    rd = csv.reader(lines)
+    next(rd) # skip first line
+    selected_values = filter(lambda l: np.datetime64(l[0])>=start_date , rd )
+    for row in selected_values:
+        country_list.append(row[1])
+        if row[1].upper()==country.upper():
+            row_date = np.datetime64(row[0])
+            row_registerd, row_recoverd, row_dead = list(x for x in map(lambda y: int(0) if len(y)==0 else int(y), row[5:8]) )
+            row_ill  = row_registerd - row_recoverd - row_dead
+            if row_date in list_date:
+                ix = list_date.index(row_date)
+                list_ill[ix] += row_ill
+                list_registered[ix] += row_registerd
+                list_dead[ix] += row_dead
+                list_recovered[ix] += row_recoverd
+            else:
+                list_date.append( row_date )
+                list_ill.append( row_ill )
+                list_registered.append( row_registerd )
+                list_dead.append( row_dead )
+                list_recovered.append( row_recoverd )
+
+    list_new_reg_raw = [ list_registered[ix]-list_registered[ix-1] for ix in range(1,len(list_registered)) ]
+    list_new_reg = [ list_new_reg_raw[ix] if list_new_reg_raw[ix]>=0 else 0 for ix in range(0,len(list_new_reg_raw)) ]
+    data = { 'date':list_date[1:], 'registered':list_registered[1:], 'ill':list_ill[1:], 'new_reg':list_new_reg, 'dead':list_dead[1:], 'recovered': list_recovered[1:] }
+    country_set = sorted( set(country_list) )
+    return data, country_set
+
+# ---------------------------------------------------------------------------
+def create_figure_r(data):
+    """ The former "covid19_main.create_figure_r": a new pyplot figure - never closed """
+    reprod_data = {}
+    raw_data = [ data['new_reg'][ix] / data['new_reg'][ix-4] if data['new_reg'][ix-4]>0 else 1
+            for ix in range(4,len(data['date'])) ]
+    reprod_data['r'] = [ raw_data[ix] if raw_data[ix] > 0 else 0 for ix in range(0,len(raw_data)) ]
+    reprod_data['date'] = data['date'][4:]
+    days = mdates.DayLocator()  # every day:
+    day_fmt = mdates.DateFormatter('%m.%d')
+    fig,ax=plt.subplots(figsize=(12,8))
+    ax.xaxis.set_major_locator(days)
+    ax.xaxis.set_major_formatter(day_fmt)
+    ax.plot('date','r',data=reprod_data,label='Reproduction rate')
+    fig.autofmt_xdate()
+    ax.legend(loc='upper center', shadow=True, fontsize='x-large')
+    ax.grid(True)
+    return fig
+
+def create_figure_focus(data):
+    """ The former "covid19_main.create_figure_focus": a new pyplot figure - never closed """
+    days = mdates.DayLocator()  # every day:
+    day_fmt = mdates.DateFormatter('%m.%d')
+    fig,ax=plt.subplots(figsize=(12,8))
+    ax.xaxis.set_major_locator(days)
+    ax.xaxis.set_major_formatter(day_fmt)
+    ax.plot('date','new_reg',data=data,label='newly infected per day')
+    fig.autofmt_xdate()
+    ax.legend(loc='upper center', shadow=True, fontsize='x-large')
+    ax.grid(True)
+    return fig
+
+def create_figure_total(data):
+    """ The former "covid19_main.create_figure_total": a new pyplot figure - never closed """
+    days = mdates.DayLocator()  # every day:
+    day_fmt = mdates.DateFormatter('%m.%d')
+    fig,ax=plt.subplots(figsize=(12,8))
+    ax.xaxis.set_major_locator(days)
+    ax.xaxis.set_major_formatter(day_fmt)
+    ax.plot('date','ill',data=data,label='currently ill')
+    ax.plot('date','registered',data=data,label='registered')
+    ax.plot('date','new_reg',data=data,label='newly infected per day')
+    fig.autofmt_xdate()
+    ax.legend(loc='upper center', shadow=True, fontsize='x-large')
+    ax.grid(True)
+    return fig
+
+def figure_2_png(fig):
+    """ The former "covid19_main.figure_2_png": the PNG as base64 string """
+    pngImage = io.BytesIO()
+    FigureCanvas(fig).print_png(pngImage)
+    pngImageB64String = "data:image/png;base64,"
+    pngImageB64String += base64.b64encode(pngImage.getvalue()).decode('utf8')
+    return pngImageB64String
+
+# the former charts of the main page: kind --> function to create the figure
+CHARTS = { 'total': create_figure_total, 'focus': create_figure_focus, 'r': create_figure_r }
+
+def render_png(kind, data, close=False):
+    """ Create the chart "kind" the former way; "close" drops the figure afterwards (no leak) """
+    fig = CHARTS[kind](data)
+    png = figure_2_png(fig)
+    if close:
+        plt.close(fig)
+    return png
+
+# ---------------------------------------------------------------------------
+def _encoder_class():
+    """ The kool JSONEncoder with the former "_get_property_names": the MRO is walked for each object """
+    import inspect
+    from kool.jsonencoder import JSONEncoder
+
+    class UncachedJSONEncoder(JSONEncoder):
+
+        def _get_property_names(self,o,marker_class):
+            property_names = []
+            for cls in inspect.getmro(o.__class__):
+                for cls_key in cls.__dict__.keys():
+                    if cls.__dict__[cls_key].__class__ == marker_class:
+                        if not cls_key in property_names:
+                            property_names.append(cls_key)
+            return property_names
+
+    return UncachedJSONEncoder
+
+def jsonify(source, indent=None):
+    """ "kool.jsonify" with the former lookup of the property names """
+    return _encoder_class()(indent=indent).encode(source)
+
+# ---------------------------------------------------------------------------
+def json_to_object(json_string):
+    """ The former "kool.json_to_object": a new namedtuple class for each dict """
+    import json
+    from collections import namedtuple
+
+    def convert(item):
+        if isinstance(item, dict):
+            try:
+                TupleClass = namedtuple('config', [k for k in item])
+                return TupleClass( *[convert(v) for v in item.values()] )
+            except ValueError:
+                return {k:convert(v) for k,v in item.items()}
+        if isinstance(item, list):
+            return [convert(value) for value in item]
+        return item
+
+    return convert(json.loads(json_string))
@@ -0,0 +1,49 @@
+# benchmark: JSON/HAL responses of the series of one country
+#
+# The encoding of a HAL document with the series of 1000 days:
+#   numpy arrays   - the fast path of kool.JSONEncoder (the API)
+#   python lists   - converted with "tolist()" before encoding
+#   numpy scalars  - lists of numpy values; each value goes through "default()"
+# and the whole request "/api/countries/<name>/series?timespan=1000".
+#
+# Usage: python bench/bench_api.py [--days 1000]
+import argparse
+
+import numpy as np
+
+import support
+from kool import JSONHalDocument, JSONLink, jsonify
+
+def series_document(convert, date, values):
+    return JSONHalDocument('/api/countries/France/series', country='France', date=convert(date)
+            ,confirmed=convert(values[0]), recovered=convert(values[1]), deaths=convert(values[2])
+            ,active=convert(values[3]), new_cases=convert(values[4]), r=convert(values[5])
+            ,prev=JSONLink('/prev'), next=JSONLink('/next'))
+
+def to_list(values):
+    return values.astype(str).tolist() if values.dtype.kind == 'M' else values.tolist()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=1000)
+    args = parser.parse_args()
+
+    date = np.arange(np.datetime64('2020-01-01'), np.datetime64('2020-01-01') + args.days)
+    values = [ np.arange(args.days, dtype=np.int64) * factor for factor in range(1, 6) ] + [ np.linspace(0, 3, args.days) ]
+    fast = jsonify(series_document(lambda x: x, date, values))
+    assert fast == jsonify(series_document(to_list, date, values))
+    for label, convert, number in (('numpy arrays (fast path)', lambda x: x, 50)
+                                  ,('python lists', to_list, 50)
+                                  ,('numpy scalars (default())', list, 5)):
+        seconds = support.best_of(lambda: jsonify(series_document(convert, date, values)), repeat=3, number=number)
+        print('encode %-28s days=%d  %.2f ms  %d bytes' % (label, args.days, seconds * 1000, len(jsonify(series_document(convert, date, values)))))
+
+    main = support.import_main(support.write_dataset(days=args.days, countries=20))
+    client = main.application.test_client()
+    url = '/api/countries/France/series?timespan=%d' % args.days
+    assert client.get(url).status_code == 200
+    seconds = support.best_of(lambda: client.get(url), repeat=3, number=20)
+    print('request %s  %.2f ms  %d bytes' % (url, seconds * 1000, len(client.get(url).data)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+# benchmark: render latency of the charts - new figure per request versus the templates
+#
+# Before: figure, axes, locator, formatter, legend and grid are built for
+#         each request (the former create_figure_*; the figure is closed).
+# After:  covid19_charts keeps one pre-built figure per chart and thread;
+#         only the data of the lines is replaced.
+#
+# Usage: python bench/bench_charts.py [--days 30] [--requests 20]
+import argparse
+
+import support
+import baseline
+import covid19_charts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    # different data for each request
+    datas = [ support.chart_data(args.days, seed) for seed in range(args.requests) ]
+    for kind in ('total', 'focus', 'r'):
+        baseline.render_png(kind, datas[0], close=True)
+        covid19_charts.render(kind, datas[0])
+        before = support.best_of(lambda: [ baseline.render_png(kind, data, close=True) for data in datas ], repeat=3) / len(datas)
+        after = support.best_of(lambda: [ covid19_charts.render(kind, data) for data in datas ], repeat=3) / len(datas)
+        print('%-6s days=%d  per request: before %.1f ms  after %.1f ms' % (kind, args.days, before * 1000, after * 1000))
+
+if __name__ == '__main__':
+    main()
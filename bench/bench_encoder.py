@@ -0,0 +1,37 @@
+# benchmark: the property names of kool.JSONEncoder - walked per object versus cached per class
+#
+# Encodes a HAL document with "--documents" embedded documents; each has
+# a link and a child document (3 objects per document).
+#
+# Usage: python bench/bench_encoder.py [--documents 10000]
+import argparse
+
+import support
+import baseline
+from kool import JSONHalDocument, JSONLink, jsonify
+
+class ItemDocument(JSONHalDocument):
+    """ A subclass: one more class in the MRO """
+    pass
+
+def build(documents):
+    root = JSONHalDocument('/items', count=documents)
+    root.add_embedded('items', [ ItemDocument('/items/%d' % ix, name='item%d' % ix, next=JSONLink('/items/%d' % (ix + 1))
+                                             ,child=JSONHalDocument('/items/%d/child' % ix, value=ix))
+                                 for ix in range(documents) ])
+    return root
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documents', type=int, default=10000)
+    args = parser.parse_args()
+
+    document = build(args.documents)
+    assert baseline.jsonify(document) == jsonify(document)
+    before = support.best_of(lambda: baseline.jsonify(document), repeat=3)
+    after = support.best_of(lambda: jsonify(document), repeat=3)
+    print('%d nested documents (%d objects): before %.3fs  after %.3fs  %d bytes'
+         % (args.documents, args.documents * 3, before, after, len(jsonify(document))))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# benchmark: bytes and CPU time per view for each format of the charts
+#
+# A view are the three charts of one country ("/chart/<kind>.<format>"):
+#   png  - rasterized on the server (default)
+#   svg  - vector graphics; drawn by the browser
+#   json - the data of the lines; the chart is drawn in the page
+# "miss" renders the charts (empty cache), "hit" reads them from the cache.
+#
+# Usage: python bench/bench_formats.py [--timespans 30,365]
+import gzip
+import time
+import argparse
+
+import support
+import covid19_charts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--timespans', default='30,365')
+    args = parser.parse_args()
+
+    main = support.import_main(support.write_dataset(days=400, countries=20))
+    client = main.application.test_client()
+
+    def view(urls, clear):
+        """ Get the charts of one view; returns (CPU seconds, bytes, gzip bytes) """
+        if clear:
+            main.png_cache.clear()
+        start = time.process_time()
+        bodies = []
+        for url in urls:
+            response = client.get(url)
+            assert response.status_code == 200, url
+            bodies.append(response.data)
+        seconds = time.process_time() - start
+        return seconds, sum(len(body) for body in bodies), sum(len(gzip.compress(body)) for body in bodies)
+
+    print('format  days  cpu/view miss  cpu/view hit  bytes/view  gzip bytes/view')
+    for timespan in [ int(days) for days in args.timespans.split(',') ]:
+        for fmt in covid19_charts.FORMATS:
+            urls = [ '/chart/%s.%s?country=Germany&timespan=%d' % (kind, fmt, timespan) for kind in covid19_charts.CHARTS ]
+            miss = min(view(urls, True)[0] for _ in range(3))
+            hit, size, compressed = min(view(urls, False) for _ in range(3))
+            print('%-6s %5d  %10.1f ms  %9.2f ms  %10d  %15d' % (fmt, timespan, miss * 1000, hit * 1000, size, compressed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# benchmark: kool.json_to_object - a namedtuple class per dict versus the cached classes
+#
+# Documents:
+#   wide  - one object with many members (at most 255: the limit of the arguments in Python 3.6)
+#   deep  - objects nested "--depth" levels
+#   array - an array of many objects with the same keys (e.g. API input)
+#   vcap  - a VCAP_SERVICES like document
+# Compared with plain "json.loads" and the lazy mode (without reading the members).
+#
+# Usage: python bench/bench_jsonreader.py [--size 10000]
+import json
+import argparse
+
+import support
+import baseline
+from kool import json_to_object
+
+def documents(size, depth):
+    deep = {'value': 0}
+    for level in range(depth):
+        deep = {'level': level, 'child': deep, 'name': 'n%d' % level}
+    vcap = {'user-provided': [ {'name': 'service%d' % ix, 'label': 'user-provided', 'tags': ['a', 'b']
+                               ,'credentials': {'uri': 'postgres://host/db%d' % ix, 'user': 'u', 'password': 'p', 'port': 5432}}
+                               for ix in range(50) ]}
+    return { 'wide': json.dumps({ 'member%d' % ix: ix for ix in range(min(size, 255)) })
+           , 'deep': json.dumps(deep)
+           , 'array': json.dumps([ {'date': '2020-01-01', 'country': 'Germany', 'confirmed': ix, 'deaths': ix // 50} for ix in range(size) ])
+           , 'vcap': json.dumps(vcap) }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--depth', type=int, default=200)
+    args = parser.parse_args()
+
+    for name, text in documents(args.size, args.depth).items():
+        assert baseline.json_to_object(text) == json_to_object(text)
+        number = 3 if name == 'array' else 100
+        loads = support.best_of(lambda: json.loads(text), repeat=3, number=number)
+        before = support.best_of(lambda: baseline.json_to_object(text), repeat=3, number=number)
+        after = support.best_of(lambda: json_to_object(text), repeat=3, number=number)
+        lazy = support.best_of(lambda: json_to_object(text, lazy=True), repeat=3, number=number)
+        print('%-6s %8d bytes  json.loads %8.2f ms  before %8.2f ms  after %8.2f ms  lazy %8.2f ms'
+             % (name, len(text), loads * 1000, before * 1000, after * 1000, lazy * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# benchmark: load time of the data sources (APP_CONFIG: Dataset.Source)
+#
+# All sources contain the same synthetic data:
+#   datahub - the combined CSV file read by HTTP (from a local server)
+#   local   - the combined CSV file on disk
+#   local   - a directory of combined CSV files (one per group of countries)
+#   jhu     - the three wide JHU files (one column per date) read by HTTP
+# Prints the time of the first load and of a call without changes.
+#
+# Usage: python bench/bench_loaders.py [--days 1000] [--countries 150]
+import os
+import csv
+import time
+import argparse
+import tempfile
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+import support
+import covid19_ingest
+import covid19_sources
+
+def write_directory(lines, directory, files=3):
+    """ Split the combined file into "files" files; the rows of a country are in one file """
+    rows = lines[1:]
+    size = -(-len(rows) // files)
+    start = 0
+    for ix in range(files):
+        stop = min(start + size, len(rows))
+        # do not split a country
+        while 0 < stop < len(rows) and rows[stop].split(',')[1] == rows[stop - 1].split(',')[1]:
+            stop += 1
+        with open(os.path.join(directory, 'part%d.csv' % ix), 'w') as f:
+            f.writelines([lines[0]] + rows[start:stop])
+        start = stop
+
+def write_jhu(lines, directory):
+    """ Write the wide JHU files confirmed.csv, deaths.csv and recovered.csv """
+    series = OrderedDict()
+    dates = OrderedDict()
+    for row in csv.reader(lines[1:]):
+        dates[row[0]] = None
+        series.setdefault((row[2], row[1]), {})[row[0]] = (row[5], row[6], row[7])
+    header = ['Province/State', 'Country/Region', 'Lat', 'Long'] + [ '%d/%d/%02d' % (day.month, day.day, day.year % 100)
+                                                                     for day in (date(*map(int, text.split('-'))) for text in dates) ]
+    for column, name in ((0, 'confirmed'), (1, 'recovered'), (2, 'deaths')):
+        with open(os.path.join(directory, '%s.csv' % name), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for (province, country), values in series.items():
+                writer.writerow([province, country, '1.0', '2.0'] + [ values[day][column] for day in dates ])
+
+def run(name, loader, reference=None):
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        table, version = loader(None)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    start = time.perf_counter()
+    loader(table)
+    unchanged = time.perf_counter() - start
+    if reference is not None:
+        # the same table from each source
+        assert table.country_names == reference.country_names
+        for column in ('confirmed', 'recovered', 'deaths'):
+            assert np.array_equal(table.matrix(column), reference.matrix(column)), column
+    print('%-28s load %.3fs  unchanged %.4fs  rows=%d countries=%d' % (name, best, unchanged, len(table), len(table.country_names)))
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=1000)
+    parser.add_argument('--countries', type=int, default=150)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='covid19_bench_')
+    lines = support.csv_lines(args.days, args.countries)
+    with open(os.path.join(directory, 'combined.csv'), 'w') as f:
+        f.writelines(lines)
+    os.mkdir(os.path.join(directory, 'parts'))
+    write_directory(lines, os.path.join(directory, 'parts'))
+    write_jhu(lines, directory)
+    base_url = support.serve_directory(directory)
+
+    reference = run('datahub (HTTP)', covid19_ingest.CsvIngest(base_url + '/combined.csv'))
+    run('local file', covid19_sources.LocalCsvLoader(os.path.join(directory, 'combined.csv')), reference)
+    run('local directory (3 files)', covid19_sources.LocalCsvLoader(os.path.join(directory, 'parts')), reference)
+    run('jhu (HTTP, 3 wide files)', covid19_sources.JhuLoader({ name: '%s/%s.csv' % (base_url, name) for name in ('confirmed', 'deaths', 'recovered') }), reference)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# benchmark: per-request CSV parsing versus the columnar table
+#
+# Before: "get_data" parsed the whole CSV file for each request.
+# After:  the file is parsed once per dataset version into a CovidTable;
+#         a request only slices the arrays of one country.
+#
+# Usage: python bench/bench_parse.py [--days 1000] [--countries 150]
+import argparse
+
+import numpy as np
+
+import support
+import baseline
+import covid19_table
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=1000)
+    parser.add_argument('--countries', type=int, default=150)
+    args = parser.parse_args()
+
+    path = support.write_dataset(days=args.days, countries=args.countries)
+    with open(path) as f:
+        lines = f.readlines()
+    print('dataset: %d rows, %d MB' % (len(lines) - 1, sum(len(line) for line in lines) // 2**20))
+
+    main = support.import_main(path)
+    table = main.dataset_store.get()
+    parse = support.best_of(lambda: covid19_table.CovidTable.from_csv(lines), repeat=3)
+    print('table: parse once per version %.3fs' % parse)
+
+    for timespan in (30, 365, args.days):
+        before = support.best_of(lambda: baseline.get_data(lines, 'France', timespan), repeat=1)
+        after = support.best_of(lambda: main.get_data(table, 'France', timespan), number=100)
+        # same series as before
+        data_before, countries_before = baseline.get_data(lines, 'France', timespan)
+        data_after, countries_after = main.get_data(table, 'France', timespan)
+        for name in data_before:
+            assert np.array_equal(np.array(data_before[name]), data_after[name]), name
+        print('timespan=%4d  per request: before %.3fs  after %.5fs' % (timespan, before, after))
+
+if __name__ == '__main__':
+    main()
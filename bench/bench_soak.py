@@ -0,0 +1,53 @@
+# soak test: RSS of a worker rendering charts
+#
+# Before: pyplot figures that are never closed - pyplot keeps all of them.
+# After:  the pre-built figures of covid19_charts; no pyplot.
+#
+# Each mode runs in a process of its own; we print the RSS while the
+# charts are rendered. The memory of "after" must stay flat.
+#
+# "before" grows by about 5 MB per chart: it renders fewer charts.
+#
+# Usage: python bench/bench_soak.py [--renders 600] [--before-renders 150] [--mode before|after]
+#        e.g. --renders 100000 --mode after for the long run
+import sys
+import time
+import argparse
+import subprocess
+
+import support
+
+def soak(mode, renders):
+    """ Render "renders" charts and print the RSS """
+    if mode == 'before':
+        import baseline
+        render = baseline.render_png
+    else:
+        import covid19_charts
+        render = covid19_charts.render
+    data = support.chart_data(30)
+    kinds = ['total', 'focus', 'r']
+    for kind in kinds:
+        render(kind, data)
+    start_rss, start = support.rss_mb(), time.perf_counter()
+    for ix in range(renders):
+        render(kinds[ix % len(kinds)], data)
+        if (ix + 1) % max(renders // 4, 1) == 0:
+            print('  %-6s renders=%6d rss=%6.1f MB' % (mode, ix + 1, support.rss_mb()))
+    print('%-6s renders=%d rss start=%.1f MB end=%.1f MB  %.1f ms/render'
+         % (mode, renders, start_rss, support.rss_mb(), (time.perf_counter() - start) * 1000 / renders))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--renders', type=int, default=600)
+    parser.add_argument('--before-renders', type=int, default=150)
+    parser.add_argument('--mode', choices=['before', 'after'])
+    args = parser.parse_args()
+    if args.mode:
+        soak(args.mode, args.renders)
+        return
+    for mode, renders in (('before', args.before_renders), ('after', args.renders)):
+        subprocess.check_call([sys.executable, __file__, '--mode', mode, '--renders', str(renders)])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+# benchmark: render time of the charts for long timespans
+#
+# Before: one point per day and one tick (label) per day - the former
+#         create_figure_* functions.
+# After:  covid19_charts: the lines are downsampled to MAX_POINTS points
+#         and the ticks adapt to the timespan (days, weeks, months).
+#
+# Usage: python bench/bench_timespan.py [--timespans 30,180,365,1000]
+import logging
+import argparse
+
+import support
+import baseline
+import covid19_charts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--timespans', default='30,180,365,1000')
+    args = parser.parse_args()
+    # the day locator of "before" warns about too many ticks for each chart
+    logging.getLogger('matplotlib').setLevel(logging.ERROR)
+
+    kinds = ['total', 'focus', 'r']
+    for timespan in [ int(days) for days in args.timespans.split(',') ]:
+        data = support.chart_data(timespan)
+        results = []
+        for render in (lambda kind: baseline.render_png(kind, data, close=True), lambda kind: covid19_charts.render(kind, data)):
+            render('total')
+            seconds = support.best_of(lambda: [ render(kind) for kind in kinds ], repeat=1 if timespan > 180 else 3) / len(kinds)
+            results.append(seconds)
+        print('%5d days  per chart: before %7.1f ms  after %6.1f ms' % (timespan, results[0] * 1000, results[1] * 1000))
+
+if __name__ == '__main__':
+    main()
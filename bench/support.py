@@ -0,0 +1,101 @@
+# helpers of the benchmarks
+#
+# The modules of the application are in "py"; they are imported from there.
+# The benchmarks use a synthetic combined CSV file: "countries" countries -
+# some with provinces - and one row per province and day until today.
+import os
+import sys
+import time
+import random
+import tempfile
+import warnings
+import threading
+import http.server
+import socketserver
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'py'))
+warnings.simplefilter('ignore')
+
+HEADER = 'Date,Country/Region,Province/State,Lat,Long,Confirmed,Recovered,Deaths\n'
+
+# provinces of some countries: the rows of a day are summed up
+PROVINCES = { 'France': ['', 'Reunion', 'Martinique'], 'Country03': ['A', 'B', 'C', 'D', 'E'], 'Country07': ['X', 'Y'] }
+
+# ---------------------------------------------------------------------------
+def csv_lines(days=1000, countries=150, seed=1):
+    """ Create the lines of a combined CSV file - including the header - sorted by country """
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=days - 1)
+    names = sorted(['Country%02d' % ix for ix in range(countries)] + ['Germany', 'Italy', 'France'])
+    lines = [HEADER]
+    for name in names:
+        for province in PROVINCES.get(name, ['']):
+            confirmed = 0
+            for offset in range(days):
+                confirmed += rng.randint(0, 500)
+                # some values are missing
+                recovered = '' if rng.random() < 0.01 else str(int(confirmed * 0.8))
+                lines.append('%s,%s,%s,1.0,2.0,%d,%s,%d\n' % ((start + timedelta(days=offset)).isoformat()
+                            ,name, province, confirmed, recovered, int(confirmed * 0.02)))
+    return lines
+
+def write_dataset(path=None, days=1000, countries=150):
+    """ Write a combined CSV file (default: a temporary file); returns the path """
+    path = path or os.path.join(tempfile.mkdtemp(prefix='covid19_bench_'), 'combined.csv')
+    with open(path, 'w') as f:
+        f.writelines(csv_lines(days, countries))
+    return path
+
+# ---------------------------------------------------------------------------
+def import_main(path):
+    """ Import the application; it reads the combined CSV file "path" (Dataset.Source=local) """
+    os.environ['LOG_CONFIG'] = '{"Level":{"Default":"WARNING","Main":"WARNING"},"Format":"%(levelname)s %(name)s %(message)s"}'
+    os.environ['APP_CONFIG'] = '{"Dataset":{"Source":"local","Path":"%s"}}' % path
+    import covid19_main
+    return covid19_main
+
+# ---------------------------------------------------------------------------
+def best_of(function, repeat=5, number=1):
+    """ Call "function" "number" times in a row; returns the best time of one call in seconds of "repeat" runs """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+# ---------------------------------------------------------------------------
+def chart_data(days=30, seed=0):
+    """ Create the data of the charts of one country (see covid19_main.get_data) for "days" days until today """
+    import numpy as np
+    rng = np.random.RandomState(seed)
+    end = np.datetime64(date.today().isoformat(), 'D')
+    registered = np.cumsum(rng.randint(0, 500, days)).astype(np.int64)
+    new_reg = np.maximum(np.diff(np.concatenate([[0], registered])), 0)
+    before = np.concatenate([np.zeros(4, dtype=np.int64), new_reg[:-4]])
+    return { 'date': np.arange(end - days + 1, end + 1), 'registered': registered, 'ill': registered // 3
+           , 'new_reg': new_reg, 'dead': registered // 50, 'recovered': registered // 2
+           , 'r': np.where(before > 0, new_reg / np.maximum(before, 1), 1.0) }
+
+def rss_mb():
+    """ Resident set size of this process in MB (Linux) """
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+# ---------------------------------------------------------------------------
+class _ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+def serve_directory(directory):
+    """ Serve the files of "directory" by HTTP in a background thread; returns the base URL """
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def translate_path(self, path):
+            return os.path.join(directory, path.split('?')[0].lstrip('/'))
+        def log_message(self, *args):
+            pass
+    server = _ThreadingServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return 'http://127.0.0.1:%d' % server.server_address[1]
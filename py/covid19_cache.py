@@ -0,0 +1,70 @@
+# in-memory caches
+import logging
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+class LRUCache(object):
+    """ Thread-safe LRU cache for byte strings
+
+    The cache is limited by the sum of the length of all stored values.
+    If a new value does not fit, the least recently used values are
+    removed. Values larger than the limit are not stored at all.
+    """
+
+    def __init__(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # counters
+        self._hits, self._misses, self._evictions = 0, 0, 0
+
+    def get(self, key):
+        """ Return the value stored for "key" or None """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        """ Store the value for "key" """
+        if len(value) > self._max_bytes:
+            log.warning('value too large for cache; key=%s size=%d', key, len(value))
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            # remove the least recently used entries until the value fits
+            while self._bytes + len(value) > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._evictions += 1
+            self._entries[key] = value
+            self._bytes += len(value)
+
+    def clear(self):
+        """ Remove all values """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """ Return the counters of the cache as dict """
+        with self._lock:
+            requests = self._hits + self._misses
+            return {'entries': len(self._entries)
+                   ,'bytes': self._bytes
+                   ,'max_bytes': self._max_bytes
+                   ,'hits': self._hits
+                   ,'misses': self._misses
+                   ,'evictions': self._evictions
+                   ,'hit_rate': round(self._hits / requests, 4) if requests > 0 else None
+                   }
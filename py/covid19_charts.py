@@ -0,0 +1,276 @@
+# covid19 charts
+#
+# The figures are created using the object-oriented matplotlib API. We do
+# not use "pyplot": it keeps every figure in a global registry until the
+# figure is closed. Each thread keeps one pre-built figure per chart; only
+# the data of the lines is replaced for each request.
+#
+# Formats of a chart:
+#   png  - rasterized by Agg (default)
+#   svg  - vector graphics; no rasterization on the server
+#   json - the data of the lines only; the browser draws the chart
+import io
+import time
+import logging
+import threading
+import numpy as np
+import matplotlib
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+import covid19_timing
+
+log = logging.getLogger(__name__)
+
+# maximum number of points of a line; longer lines are downsampled
+MAX_POINTS = 250
+# maximum number of lines (countries) of a comparison chart
+MAX_LINES = 8
+
+# the formats of a chart: format --> mime type
+FORMATS = { 'png': 'image/png', 'svg': 'image/svg+xml', 'json': 'application/json' }
+# SVG: the text is kept as text (not as paths) and the IDs are stable - the
+# same data gives the same SVG
+SVG_PARAMS = { 'svg.fonttype': 'none', 'svg.hashsalt': 'covid19' }
+
+# ticks of the x-axes by number of days shown: (max. days, locator, date format)
+TICKS = [ (45, lambda: mdates.DayLocator(), '%m.%d')
+        , (210, lambda: mdates.WeekdayLocator(byweekday=mdates.MO), '%m.%d')
+        , (730, lambda: mdates.MonthLocator(), '%Y.%m')
+        , (None, lambda: mdates.MonthLocator(bymonth=(1, 4, 7, 10)), '%Y.%m')
+        ]
+
+# ---------------------------------------------------------------------------
+def downsample(x, y, max_points=MAX_POINTS):
+    """ Reduce a line to about "max_points" points
+
+    The line is split into buckets of equal size; of each bucket we keep
+    the points with the minimum and the maximum value (in their order).
+    Peaks are preserved - the chart looks the same at the resolution of
+    the image. Lines with up to "max_points" points are returned as they are.
+    """
+    if len(y) <= max_points:
+        return x, y
+    y = np.asarray(y)
+    buckets = max_points // 2
+    size = -(-len(y) // buckets)
+    # fill the last bucket with the last value
+    padded = np.concatenate([y, np.repeat(y[-1:], buckets * size - len(y))]).reshape(buckets, size)
+    offsets = np.arange(buckets)[:, np.newaxis] * size
+    selected = np.sort(np.stack([padded.argmin(axis=1), padded.argmax(axis=1)], axis=1), axis=1) + offsets
+    # the first and the last point are always kept
+    index = np.unique(np.concatenate([[0], np.minimum(selected.reshape(-1), len(y) - 1), [len(y) - 1]]))
+    return np.asarray(x)[index], y[index]
+
+# ---------------------------------------------------------------------------
+def _lines_r(data):
+    """ Lines of the chart "r":
+    - reproduction rate (precomputed; see covid19_metrics)
+    """
+    return [ (data['date'], data['r']) ]
+
+# ---------------------------------------------------------------------------
+def _lines_focus(data):
+    """ Lines of the chart "focus":
+    - number of newly registered cases/day
+    """
+    return [ (data['date'], data['new_reg']) ]
+
+# ---------------------------------------------------------------------------
+def _lines_total(data):
+    """ Lines of the chart "total":
+    - number of currently ill persons
+    - total number of registered cases
+    - number of newly registered cases
+    """
+    return [ (data['date'], data['ill']), (data['date'], data['registered']), (data['date'], data['new_reg']) ]
+
+# the charts of the main page: kind --> (labels of the lines, function to get the lines from the data)
+CHARTS = { 'total': (['currently ill', 'registered', 'newly infected per day'], _lines_total)
+         , 'focus': (['newly infected per day'], _lines_focus)
+         , 'r'    : (['Reproduction rate'], _lines_r)
+         }
+
+# ---------------------------------------------------------------------------
+def _lines_countries(name):
+    """ Get the function that returns the lines of a comparison chart:
+    - one line for each row (country) of the matrix "name" of the data
+    """
+    def lines(data):
+        return [ (data['date'], values) for values in data[name] ]
+    return lines
+
+# the comparison charts of several countries: kind --> (title, function to get the lines from the data).
+# The labels of the lines are the names of the countries.
+COMPARE_CHARTS = { 'compare_new': ('newly infected per day', _lines_countries('new_reg'))
+                 , 'compare_ill': ('currently ill', _lines_countries('ill'))
+                 , 'compare_r'  : ('Reproduction rate', _lines_countries('r'))
+                 }
+
+# ---------------------------------------------------------------------------
+class ChartTemplate(object):
+    """ Pre-built figure of one chart
+
+    Figure, axes, locator, formatter, legend, grid and the lines are
+    created once. To render a chart we only replace the data of the lines,
+    rescale the axes and rasterize the figure again.
+
+    A template must not be used by two threads at the same time - use
+    "get_template()" to get the template of the current thread.
+    """
+
+    def __init__(self, labels, kind=None):
+        log.debug('> labels=%s', labels)
+        self.kind = kind
+        self.figure = Figure(figsize=(12,8))
+        # attach the canvas - we need it to render the figure. The time of
+        # the "draw_event" separates rendering and PNG encoding
+        self.canvas = FigureCanvas(self.figure)
+        self._drawn = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.axes = self.figure.add_subplot(1, 1, 1)
+        # the x-axes shows dates; one tick per day - see "_set_ticks" for longer timespans
+        self.axes.xaxis_date()
+        self._ticks = None
+        self._set_ticks(0)
+        # the lines - without data; lines with a label starting with "_" are not in the legend
+        self.lines = [ self.axes.plot([], [], label=label)[0] for label in labels ]
+        self._labels = list(labels)
+        # rotates and right aligns the x labels, and moves the bottom of the axes up to make room for them
+        self.figure.autofmt_xdate()
+        self._set_legend()
+        self.axes.grid(True)
+        log.debug('<')
+
+    def _set_legend(self):
+        """ Create the legend of the lines with a label """
+        handles = [ line for line in self.lines if not line.get_label().startswith('_') ]
+        if len(handles) > 0:
+            self.axes.legend(handles=handles, loc='upper center', shadow=True, fontsize='x-large')
+        elif self.axes.get_legend() is not None:
+            self.axes.get_legend().remove()
+
+    def _set_labels(self, labels):
+        """ Replace the labels of the first lines; the other lines are not shown """
+        labels = list(labels) + [ '_%d' % index for index in range(len(labels), len(self.lines)) ]
+        if labels != self._labels:
+            for line, label in zip(self.lines, labels):
+                line.set_label(label)
+            self._labels = labels
+            self._set_legend()
+
+    def _on_draw(self, event):
+        self._drawn = time.perf_counter()
+
+    def _set_ticks(self, days):
+        """ Set locator and formatter of the x-axes for a timespan of "days" """
+        for ticks in TICKS:
+            if ticks[0] is None or days <= ticks[0]:
+                break
+        if ticks is not self._ticks:
+            self.axes.xaxis.set_major_locator(ticks[1]())
+            self.axes.xaxis.set_major_formatter(mdates.DateFormatter(ticks[2]))
+            self._ticks = ticks
+
+    def render(self, lines, labels=None, title=None, fmt='png'):
+        """ Set the data of the lines and return the figure as PNG or SVG bytes
+
+        "lines" is a list of (x, y) tuples; one for each line of the template.
+        Lines with more than MAX_POINTS points are downsampled. If "labels"
+        are given, they replace the labels of the lines; lines without data
+        stay empty.
+        """
+        if labels is not None:
+            self._set_labels(labels)
+        if title is not None:
+            self.axes.set_title(title)
+        days = 0
+        for index, line in enumerate(self.lines):
+            x, y = lines[index] if index < len(lines) else ([], [])
+            days = max(days, len(x))
+            line.set_data(*downsample(x, y))
+        self._set_ticks(days)
+        self.axes.relim()
+        self.axes.autoscale_view()
+        if fmt == 'svg':
+            # the SVG backend draws the figure on its own canvas
+            svgImage = io.BytesIO()
+            start = time.perf_counter()
+            with matplotlib.rc_context(SVG_PARAMS):
+                self.canvas.print_figure(svgImage, format='svg', metadata={'Date': None})
+            covid19_timing.record('svg_%s' % self.kind, time.perf_counter() - start)
+            return svgImage.getvalue()
+        pngImage = io.BytesIO()
+        start = self._drawn = time.perf_counter()
+        self.canvas.print_png(pngImage)
+        end = time.perf_counter()
+        covid19_timing.record('render_%s' % self.kind, self._drawn - start)
+        covid19_timing.record('png', end - self._drawn)
+        return pngImage.getvalue()
+
+# the templates of the current thread: kind --> ChartTemplate
+_templates = threading.local()
+
+# ---------------------------------------------------------------------------
+def get_template(kind):
+    """ Get the template of the chart "kind" for the current thread """
+    templates = getattr(_templates, 'charts', None)
+    if templates is None:
+        templates = _templates.charts = {}
+    template = templates.get(kind)
+    if template is None:
+        if kind in COMPARE_CHARTS:
+            template = ChartTemplate([ '_%d' % index for index in range(MAX_LINES) ], kind)
+        else:
+            template = ChartTemplate(CHARTS[kind][0], kind)
+        templates[kind] = template
+    return template
+
+# ---------------------------------------------------------------------------
+def page_charts(kind):
+    """ Get the kinds of the charts shown on one page together with the chart "kind" """
+    return list(COMPARE_CHARTS if kind in COMPARE_CHARTS else CHARTS)
+
+# ---------------------------------------------------------------------------
+def _get_lines(kind, data):
+    """ Get the lines of the chart "kind": the tuple (title, labels, lines)
+
+    The data of a comparison chart contains the names of the "countries"
+    and matrices [country, day]; see covid19_main.get_compare_data.
+    """
+    if kind in COMPARE_CHARTS:
+        title, lines = COMPARE_CHARTS[kind]
+        if data.get('per_capita') and kind != 'compare_r':
+            title += ' per 100000 inhabitants'
+        return title, [ str(name) for name in data['countries'] ][:MAX_LINES], lines(data)[:MAX_LINES]
+    labels, lines = CHARTS[kind]
+    return None, labels, lines(data)
+
+# ---------------------------------------------------------------------------
+def render(kind, data, fmt='png'):
+    """ Create the chart "kind" and return it as PNG or SVG bytes """
+    log.debug('> kind=%s fmt=%s', kind, fmt)
+    title, labels, lines = _get_lines(kind, data)
+    if kind in COMPARE_CHARTS:
+        image = get_template(kind).render(lines, labels=labels, title=title, fmt=fmt)
+    else:
+        image = get_template(kind).render(lines, fmt=fmt)
+    log.debug('< size=%d', len(image))
+    return image
+
+# ---------------------------------------------------------------------------
+def chart_document(kind, data):
+    """ Get the data of the chart "kind" for a chart drawn by the browser
+
+    Returns a dict: title (None for the charts of one country), labels of
+    the lines, date (the x values of all lines) and lines (the y values of
+    each line; NaN becomes None). The lines are not downsampled.
+    """
+    title, labels, lines = _get_lines(kind, data)
+    values = []
+    for x, y in lines:
+        if y.dtype.kind == 'f' and np.isnan(y).any():
+            y = np.where(np.isnan(y), None, y)
+        values.append(y)
+    return {'kind': kind, 'title': title, 'labels': labels, 'date': data['date'], 'lines': values}
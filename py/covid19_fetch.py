@@ -0,0 +1,484 @@
+# fetch layer for the data sources
+#
+# * keep-alive connections: idle connections are kept per host and reused
+# * timeouts: separate timeouts to connect and to read - plus a deadline for
+#   the whole fetch (all tries and the body) and for all fetches of a load;
+#   the first load runs in a request: it has to finish before the worker
+#   timeout of gunicorn (30s)
+# * retries with exponential backoff for connection errors, timeouts and
+#   HTTP 5xx; redirects are followed
+# * single-flight: concurrent "fetch_bytes()" calls of the same URL share
+#   one download
+# * compression: the body is requested with gzip (and zstd, if the module
+#   "zstandard" is installed) and decompressed while it's read. Files
+#   ending with ".gz" are decompressed as well (e.g. local mirrors)
+#
+# URLs other than http/https (e.g. file://) and hosts accessed through a
+# proxy are read with urllib - without pooling.
+import time
+import zlib
+import socket
+import asyncio
+import contextlib
+import logging
+import threading
+import http.client
+import urllib.error
+import urllib.request
+from urllib.parse import urlsplit, urlunsplit, urljoin
+
+import service_utl
+
+# zstd is optional
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+log = logging.getLogger(__name__)
+
+# the encodings we accept; range requests are sent without compression:
+# the offsets refer to the uncompressed file
+ACCEPT_ENCODING = 'zstd, gzip' if zstandard is not None else 'gzip'
+# size of the blocks read from the connection if the body is compressed - or read completely
+COMPRESSED_BLOCK_SIZE = 64*1024
+
+# status codes of redirects we follow; maximum number of redirects
+REDIRECTS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+# status codes that are retried
+RETRY_STATUS = (500, 502, 503, 504)
+
+# deadline of the fetches of the current thread; see "load_deadline"
+_local = threading.local()
+
+# ---------------------------------------------------------------------------
+class FetchError(IOError):
+    """ The server answered with a status other than 2xx """
+
+    def __init__(self, url, status, reason=''):
+        IOError.__init__(self, 'HTTP %s %s; url=%s' % (status, reason, url))
+        self.url = url
+        self.status = status
+
+# ---------------------------------------------------------------------------
+class FetchResponse(object):
+    """ Response of a fetch: "status", "headers" and the body as stream
+
+    Close the response (or use it in a "with" block) when done; a fully
+    read body returns the connection into the pool.
+    """
+
+    def __init__(self, url, status, headers, body, release=None, deadline=None, set_timeout=None):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self._body = body
+        self._release = release
+        # the body must be read before the deadline (time.monotonic()); "set_timeout"
+        # limits the timeout of the socket to the remaining time
+        self._deadline = deadline
+        self._set_timeout = set_timeout
+        # the body is decompressed while it's read
+        encoding = (headers.get('Content-Encoding') or '').strip().lower()
+        if encoding in ('', 'identity') and urlsplit(url).path.endswith('.gz'):
+            encoding = 'gzip'
+        self._decoder = _create_decoder(encoding)
+        self.encoding = encoding or 'identity'
+        # number of bytes read from the connection/file
+        self.bytes_received = 0
+
+    def getcode(self):
+        return self.status
+
+    def _read_block(self, size):
+        """ Read up to "size" bytes of the raw body; at most one read from the socket
+
+        A slow server can not keep us beyond the deadline: we check it
+        before each read.
+        """
+        if self._deadline is not None:
+            remaining = self._deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout('deadline exceeded; url=%s' % self.url)
+            if self._set_timeout is not None:
+                self._set_timeout(remaining)
+        read1 = getattr(self._body, 'read1', None)
+        data = read1(size) if read1 is not None else self._body.read(size)
+        if not data:
+            # end of the body; "read()" also marks the response as complete
+            data = self._body.read()
+        self.bytes_received += len(data)
+        return data
+
+    def _read_raw(self, size):
+        if size is not None and size >= 0:
+            return self._read_block(size)
+        blocks = []
+        while True:
+            block = self._read_block(COMPRESSED_BLOCK_SIZE)
+            if not block:
+                return b''.join(blocks)
+            blocks.append(block)
+
+    def read(self, size=None):
+        """ Read the (decompressed) body
+
+        For compressed bodies a block of the compressed data is read and
+        decompressed; the result may be longer or shorter than "size".
+        Returns b'' at the end of the body.
+        """
+        if self._decoder is None:
+            return self._read_raw(size)
+        if size is None or size < 0:
+            result = self._decoder.decompress(self._read_raw(None)) + self._decoder.flush()
+            self._decoder = None
+            return result
+        while self._decoder is not None:
+            data = self._read_raw(COMPRESSED_BLOCK_SIZE)
+            if not data:
+                result = self._decoder.flush()
+                self._decoder = None
+                return result
+            result = self._decoder.decompress(data)
+            if result:
+                return result
+        return b''
+
+    def close(self):
+        if self._release is not None:
+            # the connection can be reused, if the body has been read completely
+            reusable = self._body.isclosed() and not self._body.will_close
+            self._body.close()
+            self._release(reusable)
+            self._release = None
+        else:
+            self._body.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# ---------------------------------------------------------------------------
+class _GzipDecoder(object):
+    """ Streaming gzip decoder; supports files of several gzip members """
+
+    def __init__(self):
+        self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data):
+        result = self._decoder.decompress(data)
+        while self._decoder.eof and self._decoder.unused_data:
+            data = self._decoder.unused_data
+            self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            result += self._decoder.decompress(data)
+        return result
+
+    def flush(self):
+        return self._decoder.flush()
+
+class _ZstdDecoder(object):
+    """ Streaming zstd decoder """
+
+    def __init__(self):
+        self._decoder = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data):
+        return self._decoder.decompress(data)
+
+    def flush(self):
+        return b''
+
+def _create_decoder(encoding):
+    """ Create the decoder of a content-encoding; None for uncompressed bodies """
+    if encoding in ('', 'identity'):
+        return None
+    if encoding in ('gzip', 'x-gzip'):
+        return _GzipDecoder()
+    if encoding == 'deflate':
+        return zlib.decompressobj()
+    if encoding == 'zstd' and zstandard is not None:
+        return _ZstdDecoder()
+    raise IOError('unsupported content-encoding: %s' % encoding)
+
+# ---------------------------------------------------------------------------
+class _Flight(object):
+    """ One running call of SingleFlight """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight(object):
+    """ Run a function once for concurrent calls with the same key
+
+    The first caller runs the function; callers with the same key that
+    arrive while it runs wait and get the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            log.debug('joining flight; key=%s', key)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+# ---------------------------------------------------------------------------
+class HttpFetcher(object):
+    """ HTTP GET with connection pooling, timeouts, retries and single-flight
+
+    "deadline" is the maximum time in seconds of one fetch: all tries, the
+    pauses between them and reading the body.
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=10, retries=2, backoff=0.5, max_idle=4, deadline=20):
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._deadline = deadline
+        self._retries = retries
+        self._backoff = backoff
+        self._max_idle = max_idle
+        # idle connections: (scheme, host, port) --> list of connections
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+
+    def _get_connection(self, key):
+        """ Get an idle connection of the host - or a new one. Returns (connection, reused) """
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, port, timeout=self._connect_timeout), False
+
+    def _release(self, key, connection, reusable):
+        """ Return a connection into the pool """
+        if reusable:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self._max_idle:
+                    idle.append(connection)
+                    return
+        connection.close()
+
+    def _request(self, url, headers, deadline):
+        """ One GET request; no redirects, no retries """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = urlunsplit(('', '', parts.path or '/', parts.query, ''))
+        connection, reused = self._get_connection(key)
+
+        def set_timeout(remaining):
+            # the timeouts never exceed the time left until the deadline
+            if connection.sock is not None:
+                connection.sock.settimeout(min(self._read_timeout, remaining))
+
+        def send():
+            if connection.sock is None:
+                connection.timeout = min(self._connect_timeout, _remaining(url, deadline))
+                connection.connect()
+            set_timeout(_remaining(url, deadline))
+            connection.request('GET', path, headers=headers)
+            return connection.getresponse()
+
+        try:
+            try:
+                response = send()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if not reused:
+                    raise
+                # the server closed the idle connection - try once more with a new one
+                log.debug('idle connection closed by server; url=%s', url)
+                connection.close()
+                response = send()
+        except Exception:
+            connection.close()
+            raise
+        return FetchResponse(url, response.status, response.headers, response
+                            ,lambda reusable: self._release(key, connection, reusable)
+                            ,deadline, set_timeout)
+
+    def _open_urllib(self, url, headers, deadline):
+        """ GET using urllib - for other schemes and proxies """
+        try:
+            response = urllib.request.urlopen(urllib.request.Request(url, headers=headers)
+                    ,timeout=min(self._read_timeout, _remaining(url, deadline)))
+        except urllib.error.HTTPError as e:
+            e.close()
+            raise FetchError(url, e.code, e.reason)
+        return FetchResponse(url, response.getcode() or 200, response.headers, response, deadline=deadline)
+
+    def _use_urllib(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            return True
+        return parts.scheme in urllib.request.getproxies() and not urllib.request.proxy_bypass(parts.hostname)
+
+    def open(self, url, headers=None, deadline=None):
+        """ GET the URL; returns a FetchResponse with status 2xx
+
+        "deadline" is an additional deadline (time.monotonic()) of this
+        fetch - e.g. the deadline of the load of another thread; the
+        earliest of it, the load deadline of the current thread (see
+        "load_deadline") and "deadline" of the fetcher wins.
+
+        Redirects are followed. Connection errors, timeouts and the status
+        codes RETRY_STATUS are retried "retries" times; the time between
+        the tries doubles, starting at "backoff" seconds. Raises FetchError
+        for all other status codes - including 304 - and OSError
+        (socket.timeout) if the server does not answer or the deadline is
+        exceeded - before or while the body is read.
+
+        Remark: errors while reading the body are not retried.
+        """
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'identity' if 'Range' in headers else ACCEPT_ENCODING)
+        deadline = min(value for value in (time.monotonic() + self._deadline, deadline, current_deadline()) if value is not None)
+        attempt = 0
+        redirects = 0
+        while True:
+            try:
+                if self._use_urllib(url):
+                    return self._open_urllib(url, headers, deadline)
+                response = self._request(url, headers, deadline)
+                if response.status in REDIRECTS and response.headers.get('Location') and redirects < MAX_REDIRECTS:
+                    response.read()
+                    response.close()
+                    url = urljoin(url, response.headers['Location'])
+                    redirects += 1
+                    continue
+                if response.status in RETRY_STATUS:
+                    response.read()
+                    response.close()
+                    raise FetchError(url, response.status)
+                if not 200 <= response.status < 300:
+                    response.read()
+                    response.close()
+                    # no retry
+                    raise FetchError(url, response.status)
+                return response
+            except FetchError as e:
+                if e.status not in RETRY_STATUS or attempt >= self._retries:
+                    raise
+                error = e
+            except (OSError, http.client.HTTPException) as e:
+                if attempt >= self._retries:
+                    raise
+                error = e
+            delay = self._backoff * 2 ** attempt
+            attempt += 1
+            if time.monotonic() + delay >= deadline:
+                # no time left for another try
+                raise error
+            log.warning('fetch failed - retry in %.1fs; url=%s error=%s', delay, url, error)
+            time.sleep(delay)
+
+    def fetch_bytes(self, url, headers=None, deadline=None):
+        """ GET the URL and return the body; see "open" for "deadline"
+
+        Concurrent calls for the same URL (and headers) share one download -
+        and the deadline of the first call.
+        """
+        def download():
+            with self.open(url, headers, deadline) as response:
+                return response.read()
+        return self._flights.do((url, tuple(sorted((headers or {}).items()))), download)
+
+    def close(self):
+        """ Close all idle connections """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+# ---------------------------------------------------------------------------
+def _remaining(url, deadline):
+    """ Seconds left until the deadline; raises socket.timeout if it has passed """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise socket.timeout('deadline exceeded; url=%s' % url)
+    return remaining
+
+# ---------------------------------------------------------------------------
+def current_deadline():
+    """ The load deadline (time.monotonic()) of the current thread; None if there is none """
+    return getattr(_local, 'deadline', None)
+
+# ---------------------------------------------------------------------------
+@contextlib.contextmanager
+def load_deadline(seconds):
+    """ Limit the total time of all fetches of the current thread within the block
+
+    Fetches that are not done "seconds" after entering the block fail with
+    socket.timeout. Blocks can be nested; the earlier deadline wins.
+    """
+    previous = getattr(_local, 'deadline', None)
+    deadline = time.monotonic() + seconds
+    _local.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+# ---------------------------------------------------------------------------
+class DeadlineLoader(object):
+    """ Loader of the dataset store that limits the time of all fetches of one load
+
+    E.g. the data source plus the population file; see "load_deadline".
+    """
+
+    def __init__(self, loader, seconds):
+        self._loader = loader
+        self._seconds = seconds
+
+    def __call__(self, previous):
+        with load_deadline(self._seconds):
+            return self._loader(previous)
+
+# ---------------------------------------------------------------------------
+async def fetch_bytes_async(fetcher, url, headers=None):
+    """ "fetch_bytes" for asyncio code
+
+    The download runs in the default executor of the loop - it does not
+    block the loop. Concurrent calls - from threads or coroutines - share
+    one download. The load deadline of the calling thread (see
+    "load_deadline") is passed to the thread of the executor.
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, fetcher.fetch_bytes, url, headers, current_deadline())
+
+# ---------------------------------------------------------------------------
+def create_fetcher(config):
+    """ Create the fetcher using the application configuration """
+    return HttpFetcher(connect_timeout=service_utl.get_config_value(config, 'Fetch.ConnectTimeout', 5)
+            ,read_timeout=service_utl.get_config_value(config, 'Fetch.ReadTimeout', 10)
+            ,retries=service_utl.get_config_value(config, 'Fetch.Retries', 2)
+            ,backoff=service_utl.get_config_value(config, 'Fetch.Backoff', 0.5)
+            ,max_idle=service_utl.get_config_value(config, 'Fetch.MaxIdle', 4)
+            ,deadline=service_utl.get_config_value(config, 'Fetch.Deadline', 20))
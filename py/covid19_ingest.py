@@ -0,0 +1,162 @@
+# ingestion of the combined CSV file
+import logging
+import numpy as np
+from urllib.parse import urlsplit
+
+import service_utl
+import covid19_fetch
+import covid19_timing
+from covid19_table import CovidTable
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+class LineReader(object):
+    """ Iterate the text lines of a binary stream
+
+    The stream is read in large chunks; each chunk is decoded at once.
+    "bytes_read" is the number of bytes read from the stream so far - for
+    a decompressing stream the number of uncompressed bytes.
+    """
+
+    def __init__(self, stream, chunk_size=1024*1024, encoding='utf-8'):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._encoding = encoding
+        self.bytes_read = 0
+
+    def __iter__(self):
+        rest = b''
+        while True:
+            chunk = self._stream.read(self._chunk_size)
+            if not chunk:
+                break
+            self.bytes_read += len(chunk)
+            # decode all complete lines of the chunk; keep the rest for the next chunk
+            block = rest + chunk
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            for line in block[:end].decode(self._encoding).splitlines(True):
+                yield line
+        if rest:
+            yield rest.decode(self._encoding)
+
+# ---------------------------------------------------------------------------
+class CsvIngest(object):
+    """ Loader of the dataset store for the combined CSV file
+
+    The first call reads the whole file. Later calls only add the new days
+    to the table of the previous call:
+
+    * the request contains "If-None-Match"/"If-Modified-Since"; if the file
+      did not change, the previous table is returned (HTTP 304)
+    * for files that only grow at the end ("append_only") and servers that
+      support ranges, only the bytes after the last read position are
+      requested (HTTP 206) - uncompressed; the position is counted in
+      bytes of the uncompressed file. Not used for ".gz" files.
+    * otherwise the whole file is read, but only the rows starting at the
+      last date of the previous table are parsed. The rows of the last date
+      are replaced - the last day may have been incomplete.
+
+    Rows of older days are never read again; corrections of older days in
+    the data source are picked up by a restart only.
+
+    The checkpoint belongs to the table of the last read. If "previous" is
+    another table - e.g. a snapshot written by another worker - the
+    checkpoint is dropped and the whole file is read.
+    """
+
+    def __init__(self, url, chunk_size=1024*1024, append_only=False, fetcher=None):
+        self._url = url
+        self._fetcher = fetcher or covid19_fetch.HttpFetcher()
+        self._chunk_size = chunk_size
+        self._append_only = append_only
+        # checkpoint of the last read and the version of the table it was taken for
+        self._etag, self._last_modified, self._accept_ranges, self._offset = None, None, False, 0
+        self._version = None
+
+    def __call__(self, previous):
+        """ Return the tuple (table, version) """
+        table = self.load(previous)
+        return table, table.version
+
+    def load(self, previous=None):
+        """ Read the data source and return the new table """
+        log.debug('> url=%s', self._url)
+        headers = {'Accept':'*/*','User-Agent':'curl/7.60.0'}
+        if previous is not None and previous.version != self._version:
+            # the checkpoint is not the one of "previous": its rows may be newer
+            log.debug('previous table not read by this loader; version=%s', previous.version)
+            self._etag, self._last_modified, self._accept_ranges, self._offset = None, None, False, 0
+        if previous is not None:
+            if self._etag is not None:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified is not None:
+                headers['If-Modified-Since'] = self._last_modified
+            if self._append_only and self._accept_ranges and self._offset > 0:
+                headers['Range'] = 'bytes=%d-' % self._offset
+
+        try:
+            with covid19_timing.stage('fetch'):
+                http_response = self._fetcher.open(self._url, headers)
+        except covid19_fetch.FetchError as e:
+            if e.status == 304:
+                log.debug('< not modified')
+                return previous
+            if e.status == 416:
+                # range not satisfiable: the file did not grow
+                log.debug('< no new data')
+                return previous
+            raise
+
+        # the body is read while it's parsed: "parse" contains the download
+        with http_response, covid19_timing.stage('parse'):
+            status = http_response.getcode()
+            lines = LineReader(http_response, self._chunk_size)
+            if previous is None:
+                table = CovidTable.from_csv(lines)
+            elif status == 206:
+                # only the new rows - without header
+                new_rows = CovidTable.from_csv(lines, header=False)
+                if len(new_rows) > 0 and previous.last_date is not None and new_rows.date.min() < previous.last_date:
+                    # the file did not just grow - the next call reads the whole file
+                    self._etag, self._last_modified, self._accept_ranges = None, None, False
+                    raise ValueError('range request returned old data; url=%s offset=%d' % (self._url, self._offset))
+                table = previous.append(new_rows)
+            else:
+                # the whole file - but parse only the rows starting at the last date;
+                # the date is the first column in ISO format, we compare the strings
+                last_date = str(previous.last_date) if previous.last_date is not None else ''
+                new_rows = CovidTable.from_csv((line for line in lines if line[:10] >= last_date and line[:4] != 'Date'), header=False)
+                table = previous.rows_before(np.datetime64(last_date)).append(new_rows) if last_date else new_rows
+
+            # store the checkpoint for the next call
+            self._etag = http_response.headers.get('ETag')
+            self._last_modified = http_response.headers.get('Last-Modified')
+            if status == 206:
+                self._offset += lines.bytes_read
+            else:
+                # the ranges of a ".gz" file are offsets in the compressed file
+                self._accept_ranges = (http_response.headers.get('Accept-Ranges') == 'bytes'
+                                      and not urlsplit(self._url).path.endswith('.gz'))
+                self._offset = lines.bytes_read
+            self._version = table.version
+        log.debug('< status=%d rows=%d offset=%d encoding=%s received=%d'
+                 ,status, len(table), self._offset, http_response.encoding, http_response.bytes_received)
+        return table
+
+
+# ---------------------------------------------------------------------------
+def create_ingest(config):
+    """ Create the loader for the data source using the application configuration
+
+    The data-source is a CSV file (or a gzip compressed ".csv.gz" file) with the structure:
+        Date,Country/Region,Province/State,Lat,Long,Confirmed,Recovered,Deaths
+    Example:
+        2020-05-07,Germany,,51.0,9.0,169430,141700,7392
+    """
+    return CsvIngest(service_utl.get_config_value(config, 'Dataset.Url'
+                ,'https://datahub.io/core/covid-19/r/time-series-19-covid-combined.csv')
+            ,chunk_size=service_utl.get_config_value(config, 'Dataset.ChunkSize', 1024*1024)
+            ,append_only=service_utl.get_config_value(config, 'Dataset.AppendOnly', False)
+            ,fetcher=covid19_fetch.create_fetcher(config))
@@ -1,22 +1,27 @@
 # import basics
 import sys, os, logging, atexit
+import hashlib
 import io
-import base64
+import cProfile, pstats
 from datetime import datetime
 
 # import WEB interface
-from flask import Flask, render_template, current_app, url_for, request
+from flask import Flask, render_template, current_app, url_for, request, abort, stream_with_context, g
 
 import service_utl
-from kool import get_json_attribute
+import covid19_store
+import covid19_fetch
+import covid19_sources
+import covid19_snapshot
+import covid19_metrics
+import covid19_cache
+import covid19_charts
+import covid19_render_pool
+import covid19_timing
+import covid19_warmer
+from kool import get_json_attribute, jsonify, jsonify_iter, JSONHalDocument, JSONLink, JSONStream
 
-import urllib.request as r
-import csv
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 import numpy as np
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from matplotlib.figure import Figure
 
 
 # ---------------------------------------------------------------------------
@@ -28,218 +33,190 @@ from matplotlib.figure import Figure
 log = None
 http_log = None
 
+# application configuration (optional) and the cached dataset
+config = None
+dataset_store = None
+# rendered charts: (country, timespan, chart, format, dataset version) --> PNG/SVG/JSON
+#   comparison charts: (countries, timespan, per capita, chart, format, dataset version) --> PNG/SVG/JSON
+png_cache = None
+# optional pool of processes to render the charts
+render_pool = None
+# HTML of the main page: (country, timespan, format, dataset version) --> HTML
+#   comparison page: (countries, timespan, per capita, format, dataset version) --> HTML
+page_cache = None
+# optional warmer of the caches
+cache_warmer = None
+
 # create the app
 application = Flask(__name__)
 
 # ---------------------------------------------------------------------------
-def to_lines(f):
-    """ Convert the stream from the file 'f' into an enumarable object """
-    line = f.readline()
-    while line:
-        yield line.decode('ascii')
-        line = f.readline()
-
-# ---------------------------------------------------------------------------
-def get_data(country, timespan_days):
-    """ Load data into a dict
-
-    The data-source is a CSV file with the structure:
-
-        Date,Country/Region,Province/State,Lat,Long,Confirmed,Recovered,Deaths
-
-    Example:
-        2020-05-07,Germany,,51.0,9.0,169430,141700,7392
+def get_data(table, country, timespan_days):
+    """ Load data of the table into a dict
 
     The function returns two objects:
-    1. a dict containing the following lists:
-       date       - list of date values; for the X-axes
-       registered - list of integer values; accumulated registered cases 
-       ill        - list of integer values; number of ill persons for each day
-       new_reg    - list of integer values; number of newly registed cases for each day
-       dead       - list of integer values; accumulated number of death
-       recovered  - list of integer values; accumulated number of recovered persons 
-    2. the set of country names that we can provid data for  
+    1. a dict containing the following numpy arrays:
+       date       - date values; for the X-axes
+       registered - accumulated registered cases 
+       ill        - number of ill persons for each day
+       new_reg    - number of newly registed cases for each day
+       dead       - accumulated number of death
+       recovered  - accumulated number of recovered persons 
+       r          - reproduction rate
+    2. the sorted list of country names that we can provid data for  
     """
-    log.debug('> country=%s timespan_days=%d' % (country,timespan_days) )
-    url = 'https://datahub.io/core/covid-19/r/time-series-19-covid-combined.csv'
+    log.debug('> country=%s timespan_days=%d', country, timespan_days)
     # cal start-date
-    now = datetime.now()
-    start_date = np.datetime64('%4d-%02d-%02d' %(now.year,now.month,now.day) ) - timespan_days
-
-    # create the resulting lists
-    country_list, list_date, list_registered, list_ill, list_dead, list_recovered = [ [],[],[],[],[], [] ]
-
-    # open data source
-    with r.urlopen(r.Request(url, headers={'Accept':'*/*','User-Agent':'curl/7.60.0'})) as http_response:
-        rd = csv.reader( to_lines(http_response) )
-        next(rd) # skip first line
-
-        # read only value after the start date
-        # selected_values is an nested array: [ [], [], [], .....]
-        # each array is one row from the source file
-        selected_values = filter(lambda l: np.datetime64(l[0])>=start_date , rd )
-
-        for row in selected_values:
-            # build country list
-            country_list.append(row[1])
-            # check selected country.
-            if row[1].upper()==country.upper():
-
-                # setup the date of the record
-                row_date = np.datetime64(row[0])
-
-                # setup values - some columns may be empty - assume 0 in this case
-                row_registerd, row_recoverd, row_dead = list(x for x in map(lambda y: int(0) if len(y)==0 else int(y), row[5:8]) )
-                # calc. number of persons currenlty ill
-                row_ill  = row_registerd - row_recoverd - row_dead
-
-                # for some countries we get multible values for the same day. 
-                # search the current date in out list of dates.
-                if row_date in list_date:
-                    # Found it; get the index
-                    ix = list_date.index(row_date)
-                    # sum this up
-                    list_ill[ix] += row_ill  
-                    list_registered[ix] += row_registerd
-                    list_dead[ix] += row_dead
-                    list_recovered[ix] += row_recoverd
-                else:
-                    # add data for one day
-                    list_date.append( row_date )
-                    list_ill.append( row_ill )
-                    list_registered.append( row_registerd )
-                    list_dead.append( row_dead )
-                    list_recovered.append( row_recoverd )
-
-    # calculate the newly registered cases per day. Note: this list has one value less then the others...
-    list_new_reg_raw = [ list_registered[ix]-list_registered[ix-1] for ix in range(1,len(list_registered)) ]
-    # set negativ values to 0 
-    list_new_reg = [ list_new_reg_raw[ix] if list_new_reg_raw[ix]>=0 else 0 for ix in range(0,len(list_new_reg_raw)) ] 
+    start_date = get_start_date(timespan_days)
+
+    # get the (pre-aggregated) series and the precomputed metrics of the country;
+    # we skip the first day: the first day of a series has no new cases
+    with covid19_timing.stage('filter'):
+        selected = table.series(country, start_date)
+        if selected is None:
+            # unknown country
+            return { 'date':[] }, table.country_names
+        metrics = table.metrics.series(country, start_date)
 
     # create the data house....
-    data = { 'date':list_date[1:], 'registered':list_registered[1:], 'ill':list_ill[1:], 'new_reg':list_new_reg, 'dead':list_dead[1:], 'recovered': list_recovered[1:] }
+    data = { 'date':selected['date'][1:], 'registered':selected['confirmed'][1:], 'ill':metrics['active'][1:]
+           , 'new_reg':metrics['new_cases'][1:], 'dead':selected['deaths'][1:], 'recovered': selected['recovered'][1:]
+           , 'r':metrics['r'][1:] }
 
-    # remove duplicated values from the list of countries and sort the result
-    country_set = sorted( set(country_list) )
+    # the list of countries is sorted already
+    country_set = table.country_names
 
-    log.debug('< number of data points: %d number of countries: %d' % (len(data['date']), len(country_set) )  )
+    log.debug('< number of data points: %d number of countries: %d', len(data['date']), len(country_set))
     return data, country_set
 
-def create_figure_r(data):
-    """ Create image for data 
-    
-    The function will return the firgure object with 1 plot(s):
-    - reproduction rate
+def get_timespan_days():
+    """ Read the parameter "timespan" (default: 30 days); abort the request with 400 if it's not a number """
+    try:
+        return int(request.args.get('timespan','30'))
+    except ValueError:
+        abort(400)
+
+def get_start_date(timespan_days):
+    """ Get the first date of the last "timespan_days" days """
+    now = datetime.now()
+    return np.datetime64('%4d-%02d-%02d' %(now.year,now.month,now.day) ) - timespan_days
+
+def get_country_name(table, country):
+    """ Get the name of the country as in the table - the country is searched ignoring the case
+
+    Returns "country" itself, if the country is unknown.
     """
-    log.debug('>')
-
-    # Create Data. reproduction rate is cal. like this
-    # newly_infected(today) / newly_infected(today-4d)
-
-    reprod_data = {}
-    raw_data = [ data['new_reg'][ix] / data['new_reg'][ix-4] if data['new_reg'][ix-4]>0 else 1 
-            for ix in range(4,len(data['date'])) ] 
-    # limit to range 0..10
-    reprod_data['r'] = [ raw_data[ix] if raw_data[ix] > 0 else 0 for ix in range(0,len(raw_data)) ]
-    reprod_data['date'] = data['date'][4:] 
-
-    # --------------
-    days = mdates.DayLocator()  # every day:
-    day_fmt = mdates.DateFormatter('%m.%d')
-
-    # -----------------------
-    # select format
-    fig,ax=plt.subplots(figsize=(12,8))
-    # format the ticks
-    ax.xaxis.set_major_locator(days)
-    ax.xaxis.set_major_formatter(day_fmt)
-
-    # create the 3 different plots
-    ax.plot('date','r',data=reprod_data,label='Reproduction rate')
-
-    # rotates and right aligns the x labels, and moves the bottom of the axes up to make room for them
-    fig.autofmt_xdate()
-    ax.legend(loc='upper center', shadow=True, fontsize='x-large')
-    ax.grid(True)
-    # return firgure
-    log.debug('<')
-    return fig
+    codes = table.codes([country])
+    return table.country_names[codes[0]] if len(codes) > 0 else country
+
+def get_countries(table, country):
+    """ Split the parameter "country" - a comma separated list of countries
 
-def create_figure_focus(data):
-    """ Create image for data 
-    
-    The function will return the firgure object with 1 plot(s):
-    - number of newly registered cases/day
+    Returns the array of the codes of the known countries - without
+    duplicates and at most "Compare.MaxCountries" countries.
     """
-    log.debug('>')
-    # --------------
-    days = mdates.DayLocator()  # every day:
-    day_fmt = mdates.DateFormatter('%m.%d')
-
-    # -----------------------
-    # select format
-    fig,ax=plt.subplots(figsize=(12,8))
-    # format the ticks
-    ax.xaxis.set_major_locator(days)
-    ax.xaxis.set_major_formatter(day_fmt)
-
-    # create the 3 different plots
-    ax.plot('date','new_reg',data=data,label='newly infected per day')
-
-    # rotates and right aligns the x labels, and moves the bottom of the axes up to make room for them
-    fig.autofmt_xdate()
-    ax.legend(loc='upper center', shadow=True, fontsize='x-large')
-    ax.grid(True)
-    # return firgure
-    log.debug('<')
-    return fig
-
-def create_figure_total(data):
-    """ Create image for data 
-    
-    The function will return the firgure object with 3 plots:
-    - number of currently ill persons
-    - total number of registered cases
-    - number of newly registered cases
+    max_countries = min(service_utl.get_config_value(config, 'Compare.MaxCountries', covid19_charts.MAX_LINES), covid19_charts.MAX_LINES)
+    codes = table.codes(country.split(','))
+    return np.array(list(dict.fromkeys(codes.tolist()))[:max_countries], dtype=np.int64)
+
+def get_compare_data(table, codes, timespan_days, per_capita=False):
+    """ Load the data of several countries into a dict
+
+    The series of all countries are read from the precomputed matrices
+    [country_code, day] at once: one slice of the rows "codes" for each
+    metric - no pass over the data per country. The dict contains:
+       date       - date values; for the X-axes
+       countries  - the names of the countries; the labels of the lines
+       new_reg    - matrix [country, day]: number of newly registered cases
+       ill        - matrix [country, day]: number of ill persons
+       r          - matrix [country, day]: reproduction rate
+       per_capita - new_reg and ill are per 100000 inhabitants (NaN if the
+                    population of a country is unknown)
     """
-    log.debug('>')
-    # --------------
-    days = mdates.DayLocator()  # every day:
-    day_fmt = mdates.DateFormatter('%m.%d')
-
-    # -----------------------
-    # select format
-    fig,ax=plt.subplots(figsize=(12,8))
-    # format the ticks
-    ax.xaxis.set_major_locator(days)
-    ax.xaxis.set_major_formatter(day_fmt)
-
-    # create the 3 different plots
-    ax.plot('date','ill',data=data,label='currently ill')
-    ax.plot('date','registered',data=data,label='registered')
-    ax.plot('date','new_reg',data=data,label='newly infected per day')
-
-    # rotates and right aligns the x labels, and moves the bottom of the axes up to make room for them
-    fig.autofmt_xdate()
-    ax.legend(loc='upper center', shadow=True, fontsize='x-large')
-    ax.grid(True)
-    # return firgure
-    log.debug('<')
-    return fig
-
-def figure_2_png(fig):
-    """ convert a figure object into a base64 PNG string """
-    log.debug('>')
-    # Convert plot to PNG image
-    pngImage = io.BytesIO()
-    FigureCanvas(fig).print_png(pngImage)
-    
-    # Encode PNG image to base64 string
-    pngImageB64String = "data:image/png;base64,"
-    pngImageB64String += base64.b64encode(pngImage.getvalue()).decode('utf8')
-
-    log.debug('<')
-    return pngImageB64String
+    log.debug('> codes=%s timespan_days=%d per_capita=%s', codes, timespan_days, per_capita)
+    with covid19_timing.stage('filter'):
+        start, stop = table.span(codes, get_start_date(timespan_days))
+        # we skip the first day: the first day of a series has no new cases
+        days = slice(start + 1, stop)
+        data = { 'date':table.days[days], 'countries':[ table.country_names[code] for code in codes ]
+               , 'new_reg':table.metrics.matrix('new_cases')[codes, days], 'ill':table.metrics.matrix('active')[codes, days]
+               , 'r':table.metrics.matrix('r')[codes, days], 'per_capita':per_capita }
+        if per_capita:
+            scale = 100000 / table.metrics.population[codes][:, np.newaxis]
+            data['new_reg'] = data['new_reg'] * scale
+            data['ill'] = data['ill'] * scale
+    log.debug('< number of data points: %d number of countries: %d', len(data['date']), len(codes))
+    return data
+
+def get_chart(kind, key, data, version, fmt='png'):
+    """ Get a chart as PNG, SVG or JSON from the cache - create it on a cache miss
+
+    "key" identifies the data: (country, timespan) or (countries, timespan, per capita)
+    """
+    chart = png_cache.get(key + (kind, fmt, version))
+    if chart is None:
+        if fmt == 'json':
+            # the browser draws the chart - we only encode the data
+            with covid19_timing.stage('json'):
+                charts = { kind:jsonify(covid19_charts.chart_document(kind, data), indent=None).encode('utf-8') }
+        elif render_pool is not None:
+            # render all charts of the page concurrently - the browser will ask for the others next
+            with covid19_timing.stage('render_pool'):
+                charts = render_pool.render(covid19_charts.page_charts(kind), data, fmt)
+        else:
+            charts = { kind:covid19_charts.render(kind, data, fmt) }
+        for other_kind, other_chart in charts.items():
+            png_cache.put(key + (other_kind, fmt, version), other_chart)
+        chart = charts[kind]
+    return chart
+
+def get_page(table, country, timespan_days, fmt='png'):
+    """ Get the HTML of the main page from the cache - create it on a cache miss
+
+    "fmt" is the format of the charts. Returns None, if there is no data
+    for the country.
+    """
+    key = (country, timespan_days, fmt, table.version)
+    page = page_cache.get(key)
+    if page is None:
+        data, country_set = get_data(table, country, timespan_days)
+        if len(data['date']) == 0:
+            return None
+        # render the "main" template; the figures are loaded from /chart/<kind>.<fmt>
+        with covid19_timing.stage('template'):
+            page = render_template('index.html',country=country,countries=country_set,timespan=timespan_days,format=fmt).encode('utf-8')
+        page_cache.put(key, page)
+    return page
+
+def get_compare_page(table, codes, timespan_days, per_capita, fmt='png'):
+    """ Get the HTML of the comparison page of several countries from the cache - create it on a cache miss """
+    countries = [ table.country_names[code] for code in codes ]
+    key = (','.join(countries), timespan_days, per_capita, fmt, table.version)
+    page = page_cache.get(key)
+    if page is None:
+        with covid19_timing.stage('template'):
+            page = render_template('compare.html',country=','.join(countries),countries=table.country_names
+                    ,timespan=timespan_days,per_capita=per_capita,has_population=table.metrics.has_population
+                    ,format=fmt).encode('utf-8')
+        page_cache.put(key, page)
+    return page
+
+def warm_page(key, version):
+    """ Create the page and the charts of a key (country, timespan) - called by the cache warmer """
+    country, timespan_days = key
+    table = dataset_store.get()
+    if table.version != version:
+        # there is a newer version already - the warmer will be called again
+        return
+    country = get_country_name(table, country)
+    data, country_set = get_data(table, country, timespan_days)
+    if len(data['date']) == 0:
+        return
+    for kind in covid19_charts.CHARTS:
+        get_chart(kind, (country.upper(), timespan_days), data, version)
+    # we need a request context to render the template
+    with application.test_request_context('/'):
+        get_page(table, country, timespan_days)
 
 # ---------------------------------------------------------------------------
 #
@@ -247,27 +224,221 @@ def figure_2_png(fig):
 #
 
 # --------------- / ---------------------------------------------------------
-# main route
+# main route; "country" may be a comma separated list of countries to compare,
+# "format" is the format of the charts (png, svg or json)
 @application.route('/')
 def index():
     country = request.args.get('country','Germany')
-    timespan_days = int(request.args.get('timespan','30') )
-    data, country_set = get_data(country, timespan_days)
+    timespan_days = get_timespan_days()
+    fmt = request.args.get('format','png')
+    if fmt not in covid19_charts.FORMATS:
+        abort(400)
+    try:
+        table = dataset_store.get()
+    except covid19_store.DatasetUnavailableError:
+        # no data loaded so far and the data source is down
+        log.warning('dataset not available')
+        return 'COVID19 data source currently not available - try again later', 503
+    if ',' in country:
+        codes = get_countries(table, country)
+        if len(codes) > 0:
+            page = get_compare_page(table, codes, timespan_days, get_per_capita(table), fmt)
+            return application.response_class(page, mimetype='text/html')
+        page = None
+    else:
+        # the pages are cached and counted by the name of the country in the table
+        country = get_country_name(table, country)
+        page = get_page(table, country, timespan_days, fmt)
 
     # check, if data found for country...
-    if len(data['date']) > 0:
-        # create the figures
-        figure_total = create_figure_total(data)
-        figure_focus = create_figure_focus(data)
-        figure_r     = create_figure_r(data)
-        # render the "main" template including all figures
-        return render_template('index.html'
-                ,image_total=figure_2_png(figure_total)
-                ,image_focus=figure_2_png(figure_focus)
-                ,image_r    =figure_2_png(figure_r)
-                ,country=country,countries=country_set,timespan=timespan_days)
+    if page is not None:
+        if cache_warmer is not None:
+            cache_warmer.record((country, timespan_days))
+        return application.response_class(page, mimetype='text/html')
     # country not found; render a different template    
-    return render_template('unknown_country.html',country=country,countries=country_set,timespan=timespan_days)
+    with covid19_timing.stage('template'):
+        return render_template('unknown_country.html',country=country,countries=table.country_names,timespan=timespan_days,format=fmt)
+
+# --------------- /chart/<kind>.<fmt> ---------------------------------------
+# one chart: the PNG or SVG image - or the data of the lines as JSON
+@application.route('/chart/<kind>.png', defaults={'fmt': 'png'})
+@application.route('/chart/<kind>.<any(svg, json):fmt>')
+def chart(kind, fmt):
+    country = request.args.get('country','Germany')
+    timespan_days = get_timespan_days()
+    if kind not in covid19_charts.CHARTS and kind not in covid19_charts.COMPARE_CHARTS:
+        abort(404)
+    try:
+        table = dataset_store.get()
+    except covid19_store.DatasetUnavailableError:
+        log.warning('dataset not available')
+        abort(503)
+
+    if kind in covid19_charts.COMPARE_CHARTS:
+        codes = get_countries(table, country)
+        if len(codes) == 0:
+            abort(404)
+        per_capita = get_per_capita(table)
+        key = (','.join(table.country_names[code] for code in codes).upper(), timespan_days, per_capita)
+        get_chart_data = lambda: get_compare_data(table, codes, timespan_days, per_capita)
+    else:
+        key = (country.upper(), timespan_days)
+        get_chart_data = lambda: get_data(table, country, timespan_days)[0]
+
+    # the image only changes with a new version of the dataset. If the client
+    # has the current image already, we are done without creating it.
+    etag = hashlib.sha1('|'.join(str(value) for value in (table.version, kind, fmt) + key).encode('utf8')).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = application.response_class(status=304)
+    else:
+        data = get_chart_data()
+        if len(data['date']) == 0:
+            abort(404)
+        response = application.response_class(get_chart(kind, key, data, table.version, fmt)
+                ,mimetype=covid19_charts.FORMATS[fmt])
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = service_utl.get_config_value(config, 'Cache.MaxAge', 3600)
+    return response
+
+def get_per_capita(table):
+    """ Read the parameter "per_capita"; only used if the population is known """
+    return request.args.get('per_capita') == '1' and table.metrics.has_population
+
+# --------------- /stats ----------------------------------------------------
+# counters of the caches
+@application.route('/stats')
+def stats():
+    return application.response_class(jsonify(get_stats(), indent=2), mimetype='application/json')
+
+def get_stats():
+    """ Counters of the dataset store and the caches """
+    result = {'dataset': dataset_store.stats(), 'png_cache': png_cache.stats(), 'page_cache': page_cache.stats()}
+    if cache_warmer is not None:
+        result['cache_warmer'] = cache_warmer.stats()
+    return result
+
+# --------------- /metrics --------------------------------------------------
+# timings of the stages + counters of the caches in the Prometheus text format
+@application.route('/metrics')
+def metrics():
+    return application.response_class(covid19_timing.prometheus_text(get_stats())
+            ,mimetype='text/plain; version=0.0.4')
+
+# ---------------------------------------------------------------------------
+#
+#  JSON/HAL API
+#
+
+def hal_response(document):
+    """ Create the response for a HAL document
+
+    We do not indent the JSON: the C implementation of the encoder is used
+    and the numpy arrays of the document are encoded as plain lists.
+    """
+    return application.response_class(jsonify(document, indent=None), mimetype='application/hal+json')
+
+def get_table_or_abort():
+    """ Get the dataset; abort the request with 503 if not available """
+    try:
+        return dataset_store.get()
+    except covid19_store.DatasetUnavailableError:
+        log.warning('dataset not available')
+        abort(503)
+
+# --------------- /api/countries --------------------------------------------
+# paged list of all countries
+@application.route('/api/countries')
+def api_countries():
+    try:
+        page = int(request.args.get('page','0'))
+        size = int(request.args.get('size','50'))
+    except ValueError:
+        abort(400)
+    if page < 0 or size < 1:
+        abort(400)
+    countries = get_table_or_abort().country_names
+
+    document = JSONHalDocument(url_for('api_countries', page=page, size=size)
+            ,count=len(countries), page=page, size=size
+            ,series=JSONLink(href='/api/countries/{name}/series{?timespan,end}', templated=True))
+    if page > 0:
+        document.add_link('prev', url_for('api_countries', page=page-1, size=size))
+    if (page+1)*size < len(countries):
+        document.add_link('next', url_for('api_countries', page=page+1, size=size))
+    document.add_embedded('countries', [ JSONHalDocument(url_for('api_series', name=name), name=name)
+            for name in countries[page*size:(page+1)*size] ])
+    return hal_response(document)
+
+# --------------- /api/countries/<name>/series ------------------------------
+def series_document(table, name, start_date, end_date, link_self):
+    """ Create the HAL document with the time series of one country from "start_date" until "end_date" """
+    series = table.series(name, start_date, end_date)
+    metrics = table.metrics.series(name, start_date, end_date)
+    document = JSONHalDocument(link_self
+            ,country=name, start=str(start_date), end=str(end_date)
+            ,date=series['date']
+            ,confirmed=series['confirmed']
+            ,recovered=series['recovered']
+            ,deaths=series['deaths']
+            ,active=metrics['active']
+            ,new_cases=metrics['new_cases']
+            ,new_cases_avg=metrics['new_cases_avg']
+            ,r=metrics['r'])
+    # the incidence is unknown without the population (NaN is no valid JSON)
+    if table.metrics.has_population:
+        document.add_property('incidence', np.where(np.isnan(metrics['incidence']), None, metrics['incidence']))
+    return document
+
+def get_end_date(default):
+    """ Read the parameter "end"; abort the request with 400 if it's not a date """
+    try:
+        return np.datetime64(request.args.get('end', str(default)), 'D')
+    except ValueError:
+        abort(400)
+
+# time series of one country: the "timespan" days until the date "end"
+@application.route('/api/countries/<name>/series')
+def api_series(name):
+    timespan_days = get_timespan_days()
+    table = get_table_or_abort()
+    date_range = table.date_range(name)
+    if date_range is None or timespan_days < 1:
+        abort(404)
+    first_date, last_date = date_range
+    end_date = get_end_date(last_date)
+    start_date = end_date - timespan_days + 1
+
+    document = series_document(table, name, start_date, end_date
+            ,url_for('api_series', name=name, timespan=timespan_days, end=str(end_date)))
+    document.add_property('timespan', timespan_days)
+    document.add_link('countries', url_for('api_countries'))
+    if start_date > first_date:
+        document.add_link('prev', url_for('api_series', name=name, timespan=timespan_days, end=str(start_date - 1)))
+    if end_date < last_date:
+        document.add_link('next', url_for('api_series', name=name, timespan=timespan_days, end=str(min(end_date + timespan_days, last_date))))
+    return hal_response(document)
+
+# --------------- /api/series -----------------------------------------------
+# time series of all countries: the "timespan" days until the date "end".
+# The document grows with the number of countries and days: it's streamed
+# and the series of a country are read while the JSON is encoded.
+@application.route('/api/series')
+def api_series_all():
+    timespan_days = get_timespan_days()
+    table = get_table_or_abort()
+    if timespan_days < 1 or table.last_date is None:
+        abort(404)
+    end_date = get_end_date(table.last_date)
+    start_date = end_date - timespan_days + 1
+
+    document = JSONHalDocument(url_for('api_series_all', timespan=timespan_days, end=str(end_date))
+            ,count=len(table.country_names), timespan=timespan_days, start=str(start_date), end=str(end_date)
+            ,countries=JSONLink(href=url_for('api_countries')))
+    document.add_embedded('series', JSONStream(
+            series_document(table, name, start_date, end_date, url_for('api_series', name=name, timespan=timespan_days, end=str(end_date)))
+            for name in table.country_names))
+    return application.response_class(stream_with_context(jsonify_iter(document, indent=None)), mimetype='application/hal+json')
 
 # ---------------------------------------------------------------------------
 #
@@ -277,11 +448,30 @@ def index():
 # ---------------------------------------------------------------------------
 def before_request():
     log.debug('> ')
+    covid19_timing.start_request()
+    # profile the request - if enabled in the configuration
+    if request.args.get('profile') == '1' and service_utl.get_config_value(config, 'Profiling.Enabled', False):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
     log.debug('<')
 
+# ---------------------------------------------------------------------------
+def after_request(response):
+    """ Add the timings of the stages; replace the response by the profile if requested """
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        profile = io.StringIO()
+        pstats.Stats(profiler, stream=profile).sort_stats('cumulative').print_stats(40)
+        response = application.response_class(profile.getvalue(), mimetype='text/plain')
+    server_timing = covid19_timing.end_request(request.endpoint)
+    if server_timing:
+        response.headers['Server-Timing'] = server_timing
+    return response
+
 # ---------------------------------------------------------------------------
 def tear_down_request(application):
-    log.debug('> %s' % application)
+    log.debug('> %s', application)
     log.debug('<')
 
 # ---------------------------------------------------------------------------
@@ -291,20 +481,22 @@ def sig_term_handler(signum, stack):
 # ---------------------------------------------------------------------------
 def atexit_handler():
     """ Called before exit of the process    """
-    pass
+    if render_pool is not None:
+        render_pool.close()
 
 # ---------------------------------------------------------------------------
 def init():
     """ Init infrastructure
 
     - init logging
-    - register before_request handler
+    - register before_request + after_request handler (timings, profiling)
     - register teardown handler
     - register handler for signal "SIGTERM"
+    - read the application configuration and create the dataset store + caches
 
     """
     # get access to the global variables
-    global log, http_log, application, db_pool
+    global log, http_log, application, db_pool, config, dataset_store, png_cache, render_pool, page_cache, cache_warmer
 
     # get the logging configuration from the environment
     log_config = get_json_attribute(os.getenv("LOG_CONFIG"))
@@ -338,6 +530,7 @@ def init():
 
     # register startup
     application.before_request(before_request)
+    application.after_request(after_request)
 
     # register teardown
     # NOTE: in debug-mode, the tear-down functions are NOT called
@@ -346,6 +539,52 @@ def init():
     # we register a handler here that will close the connection pool
     atexit.register(atexit_handler)
 
+    # get the (optional) application configuration from the environment
+    config = service_utl.get_app_config()
+
+    # the dataset is loaded on first use and refreshed in the background
+    if service_utl.get_config_value(config, 'Dataset.Mode', 'local') == 'shared':
+        # a single refresher process (see covid19_refresher) publishes the dataset
+        # as snapshot; the workers only attach to the current snapshot
+        loader = covid19_snapshot.SnapshotAttacher(service_utl.get_config_value(config, 'Dataset.SnapshotDir', covid19_snapshot.DEFAULT_DIRECTORY))
+        # snapshots written without the metrics get them computed here
+        loader = covid19_metrics.create_metrics_loader(loader, config)
+        # check for new versions - or for the first snapshot - every few seconds
+        ttl = retry_interval = service_utl.get_config_value(config, 'Dataset.CheckInterval', 30)
+    else:
+        # the derived metrics are computed once for each new version - before the snapshot is written
+        loader = covid19_metrics.create_metrics_loader(covid19_sources.create_loader(config), config)
+        ttl = service_utl.get_config_value(config, 'Dataset.TTL', 3600)
+        retry_interval = service_utl.get_config_value(config, 'Dataset.RetryInterval', 60)
+        # the workers share the parsed dataset and its metrics using a snapshot on disk - if configured
+        if service_utl.get_config_value(config, 'Dataset.SnapshotDir') is not None:
+            loader = covid19_snapshot.SnapshotLoader(loader, service_utl.get_config_value(config, 'Dataset.SnapshotDir'), max_age=ttl)
+            # snapshots read from disk carry the metrics; only snapshots without them get them computed here
+            loader = covid19_metrics.create_metrics_loader(loader, config)
+    # the first load runs in a request: all its downloads must be done before the worker timeout
+    loader = covid19_fetch.DeadlineLoader(loader, service_utl.get_config_value(config, 'Fetch.LoadDeadline', 25))
+    dataset_store = covid19_store.DatasetStore(loader, ttl=ttl, retry_interval=retry_interval)
+
+    # the rendered charts and pages are dropped when a new version of the dataset arrives
+    png_cache = covid19_cache.LRUCache(service_utl.get_config_value(config, 'Cache.PngMaxBytes', 16*1024*1024))
+    dataset_store.add_listener(lambda version: png_cache.clear())
+    page_cache = covid19_cache.LRUCache(service_utl.get_config_value(config, 'Cache.PageMaxBytes', 4*1024*1024))
+    dataset_store.add_listener(lambda version: page_cache.clear())
+
+    # render the charts in a pool of processes - if configured. Not in the processes of
+    # the pool: they import this module as "__mp_main__" if it's run as script
+    if service_utl.get_config_value(config, 'RenderPool.Processes', 0) > 0 and __name__ != '__mp_main__':
+        render_pool = covid19_render_pool.RenderPool(service_utl.get_config_value(config, 'RenderPool.Processes', 0)
+                ,timeout=service_utl.get_config_value(config, 'RenderPool.Timeout', 10))
+        render_pool.start()
+
+    # create the popular pages after each new version - if configured
+    warm_keys = [ (page.Country, page.Timespan) for page in service_utl.get_config_value(config, 'Warmer.Pages', []) ]
+    top_n = service_utl.get_config_value(config, 'Warmer.TopN', 0)
+    if len(warm_keys) > 0 or top_n > 0:
+        cache_warmer = covid19_warmer.CacheWarmer(warm_page, warm_keys, top_n)
+        dataset_store.add_listener(cache_warmer.start)
+
     log.debug('done with init')
 
 # ---------------------------------------------------------------------------
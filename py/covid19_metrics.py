@@ -0,0 +1,186 @@
+# derived metrics of the covid19 table
+#
+# The metrics are computed for all countries at once - as numpy operations
+# on the matrices [country_code, day] of the table - when a new version of
+# the dataset is loaded. Requests only slice the precomputed matrices.
+import csv
+import logging
+import numpy as np
+
+import service_utl
+import covid19_fetch
+import covid19_timing
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+def _diff(values):
+    """ Daily increase of accumulated values; negative values (corrections) become 0 """
+    return np.maximum(np.diff(values, axis=1, prepend=0), 0)
+
+# ---------------------------------------------------------------------------
+def _rolling_sum(values, window):
+    """ Sum of the last "window" days (including the day) for each day """
+    cumsum = np.cumsum(values, axis=1, dtype=np.float64)
+    result = cumsum.copy()
+    result[:, window:] -= cumsum[:, :-window]
+    return result
+
+# ---------------------------------------------------------------------------
+def _rolling_mean(values, window):
+    """ Mean of the last "window" days; the first days use the days available """
+    days = np.minimum(np.arange(1, values.shape[1] + 1), window)
+    return _rolling_sum(values, window) / days
+
+# ---------------------------------------------------------------------------
+def _reproduction_rate(new_cases, serial_interval, max_r):
+    """ Reproduction rate: new_cases(today) / new_cases(today - serial_interval)
+
+    Days without new cases "serial_interval" days before get the rate 1;
+    the rate is limited to the range 0..max_r.
+    """
+    r = np.ones(new_cases.shape)
+    earlier, today = new_cases[:, :-serial_interval], new_cases[:, serial_interval:]
+    np.divide(today, earlier, out=r[:, serial_interval:], where=earlier > 0)
+    return np.clip(r, 0, max_r)
+
+# ---------------------------------------------------------------------------
+class CovidMetrics(object):
+    """ Derived metrics of all countries of a table
+
+    The metrics are matrices [country_code, day] like the series of the
+    table:
+        new_cases      - newly registered cases per day
+        new_deaths     - new deaths per day
+        active         - currently ill persons: confirmed - recovered - deaths
+        new_cases_avg  - mean of the new cases of the last "window" days
+        new_deaths_avg - mean of the new deaths of the last "window" days
+        r              - reproduction rate; see _reproduction_rate
+        incidence      - new cases of the last "window" days per 100000
+                         inhabitants; NaN if the population is unknown
+
+    "population" is the array of the number of inhabitants by country
+    code; NaN if unknown.
+
+    The metrics are stored in the snapshots of the table (see
+    covid19_snapshot): the workers attach to the matrices computed once by
+    the process that wrote the snapshot.
+    """
+
+    NAMES = ('new_cases', 'new_deaths', 'active', 'new_cases_avg', 'new_deaths_avg', 'r', 'incidence')
+
+    def __init__(self, table, serial_interval=4, window=7, max_r=10, population=None, arrays=None):
+        """ Compute the metrics of the table
+
+        "population" is a dict: upper-case country name --> number of inhabitants
+        "arrays" are the arrays returned by "arrays()" of the metrics of the
+        same table; if given, the metrics are not computed again.
+        """
+        log.debug('> version=%s', table.version)
+        self._table = table
+        if arrays is not None:
+            self._metrics = {name: arrays[name] for name in self.NAMES}
+            self.population = arrays['population']
+            self.has_population = bool(np.isfinite(self.population).any())
+            log.debug('< from arrays')
+            return
+        confirmed, recovered, deaths = (table.matrix(name) for name in ('confirmed', 'recovered', 'deaths'))
+        self._metrics = {}
+        self._metrics['new_cases'] = _diff(confirmed)
+        self._metrics['new_deaths'] = _diff(deaths)
+        self._metrics['active'] = confirmed - recovered - deaths
+        self._metrics['new_cases_avg'] = _rolling_mean(self._metrics['new_cases'], window)
+        self._metrics['new_deaths_avg'] = _rolling_mean(self._metrics['new_deaths'], window)
+        self._metrics['r'] = _reproduction_rate(self._metrics['new_cases'], serial_interval, max_r)
+
+        population = population or {}
+        inhabitants = np.array([ population.get(name.upper(), np.nan) for name in table.country_names ], dtype=np.float64)
+        self.has_population = bool(np.isfinite(inhabitants).any())
+        self.population = inhabitants
+        self.population.flags.writeable = False
+        self._metrics['incidence'] = _rolling_sum(self._metrics['new_cases'], window) * 100000 / inhabitants[:, np.newaxis]
+
+        for values in self._metrics.values():
+            values.flags.writeable = False
+        log.debug('<')
+
+    def arrays(self):
+        """ Return the matrices and the population as dict: name --> numpy array """
+        result = dict(self._metrics)
+        result['population'] = self.population
+        return result
+
+    def matrix(self, name):
+        """ Get the matrix [country_code, day] of the metric "name" """
+        return self._metrics[name]
+
+    def series(self, country, start_date=None, end_date=None):
+        """ Get the metrics of one country from "start_date" until "end_date" (included)
+
+        Returns a dict: name of the metric --> read-only array; the days
+        are the same as of "table.series()". Returns None, if the country
+        is unknown.
+        """
+        window = self._table.window(country, start_date, end_date)
+        if window is None:
+            return None
+        code, start, stop = window
+        return { name: values[code, start:stop] for name, values in self._metrics.items() }
+
+# ---------------------------------------------------------------------------
+def read_population(url, fetcher):
+    """ Read the number of inhabitants of the countries from a CSV file
+
+    The CSV file has a header and the structure:
+        Country,Population
+    Returns a dict: upper-case country name --> number of inhabitants
+    """
+    log.debug('> url=%s', url)
+    lines = fetcher.fetch_bytes(url).decode('utf-8').splitlines()
+    population = {}
+    for row in csv.reader(lines[1:]):
+        if len(row) >= 2 and row[1]:
+            population[row[0].upper()] = float(row[1])
+    log.debug('< countries=%d', len(population))
+    return population
+
+# ---------------------------------------------------------------------------
+class MetricsLoader(object):
+    """ Loader of the dataset store that computes the metrics of each new table
+
+    The metrics are set as "metrics" of the table returned by "loader".
+    """
+
+    def __init__(self, loader, serial_interval=4, window=7, max_r=10, population_url=None, fetcher=None):
+        self._loader = loader
+        self._fetcher = fetcher or covid19_fetch.HttpFetcher()
+        self._options = {'serial_interval': serial_interval, 'window': window, 'max_r': max_r}
+        self._population_url = population_url
+        self._population = None
+
+    def _get_population(self):
+        """ Read the population on first use; an unavailable file is read again next time """
+        if self._population is None and self._population_url is not None:
+            try:
+                self._population = read_population(self._population_url, self._fetcher)
+            except (OSError, ValueError):
+                log.exception('failed to read population; url=%s', self._population_url)
+        return self._population
+
+    def __call__(self, previous):
+        table, version = self._loader(previous)
+        if table.metrics is None:
+            population = self._get_population()
+            with covid19_timing.stage('metrics'):
+                table.metrics = CovidMetrics(table, population=population, **self._options)
+        return table, version
+
+# ---------------------------------------------------------------------------
+def create_metrics_loader(loader, config):
+    """ Wrap the loader of the dataset store using the application configuration """
+    return MetricsLoader(loader
+            ,serial_interval=service_utl.get_config_value(config, 'Metrics.SerialInterval', 4)
+            ,window=service_utl.get_config_value(config, 'Metrics.Window', 7)
+            ,max_r=service_utl.get_config_value(config, 'Metrics.MaxR', 10)
+            ,population_url=service_utl.get_config_value(config, 'Metrics.PopulationUrl')
+            ,fetcher=covid19_fetch.create_fetcher(config))
@@ -0,0 +1,83 @@
+# refresher of the shared dataset
+#
+# In "shared" mode (APP_CONFIG: Dataset.Mode="shared") the workers do not
+# read the data source. A single refresher downloads and parses the data
+# and publishes each new version as snapshot (see covid19_snapshot). The
+# refresher runs as separate process - never as thread of the gunicorn
+# master, which forks the workers:
+#   * started by the gunicorn master (see gunicorn.conf.py); it stops when
+#     the master is gone: python covid19_refresher.py --parent <pid>
+#   * or on its own: python covid19_refresher.py
+import os
+import sys
+import time
+import logging
+import threading
+
+import service_utl
+import covid19_sources
+import covid19_metrics
+import covid19_snapshot
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+class SnapshotRefresher(object):
+    """ Load the dataset every "interval" seconds and publish new versions as snapshot """
+
+    def __init__(self, loader, directory, interval=3600, retry_interval=60):
+        self._loader = loader
+        self._directory = directory
+        self._interval = interval
+        self._retry_interval = retry_interval
+        self._table = None
+
+    def refresh(self):
+        """ Load the dataset; write a snapshot if the version changed """
+        header = covid19_snapshot.read_header(self._directory)
+        self._table, version = self._loader(self._table)
+        if header is None or header['version'] != version:
+            covid19_snapshot.write_snapshot(self._table, self._directory)
+            log.info('published new snapshot; version=%s', version)
+
+    def run(self):
+        """ Refresh forever """
+        while True:
+            try:
+                self.refresh()
+                time.sleep(self._interval)
+            except Exception:
+                log.exception('refresh failed')
+                time.sleep(self._retry_interval)
+
+# ---------------------------------------------------------------------------
+def watch_parent(pid, interval=5):
+    """ Exit the process if the parent process "pid" is gone - e.g. the gunicorn master got killed """
+    def watch():
+        while os.getppid() == pid:
+            time.sleep(interval)
+        log.warning('parent process gone - exit; parent=%d', pid)
+        os._exit(0)
+    thread = threading.Thread(target=watch, name='watch_parent', daemon=True)
+    thread.start()
+    return thread
+
+# ---------------------------------------------------------------------------
+def create_refresher(config):
+    """ Create the refresher using the application configuration
+
+    The metrics are computed by the refresher and published with the
+    snapshot; the workers only attach to them.
+    """
+    return SnapshotRefresher(covid19_metrics.create_metrics_loader(covid19_sources.create_loader(config), config)
+            ,service_utl.get_config_value(config, 'Dataset.SnapshotDir', covid19_snapshot.DEFAULT_DIRECTORY)
+            ,interval=service_utl.get_config_value(config, 'Dataset.TTL', 3600)
+            ,retry_interval=service_utl.get_config_value(config, 'Dataset.RetryInterval', 60))
+
+# ---------------------------------------------------------------------------
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout
+            ,format='%(levelname)8s %(lineno)4.4d %(module)12s %(threadName)10s %(name)s.%(funcName)s %(message)s')
+    if '--parent' in sys.argv:
+        watch_parent(int(sys.argv[sys.argv.index('--parent') + 1]))
+    create_refresher(service_utl.get_app_config()).run()
@@ -0,0 +1,99 @@
+# render pool
+#
+# Agg rasterization is CPU bound and holds the GIL - threads do not help.
+# The pool renders the charts of one page in pre-warmed worker processes.
+#
+# The worker processes are not forked from the gunicorn worker: its threads
+# (dataset store, warmer, requests) may hold locks (logging, timing) at the
+# time of the fork. They are forked from a "forkserver" process - a new
+# interpreter that has imported this module (and matplotlib) only.
+import os
+import logging
+import threading
+import multiprocessing
+import numpy as np
+
+import covid19_charts
+
+log = logging.getLogger(__name__)
+
+# the processes of the pool are started by the forkserver; it imports the charts up front
+_context = multiprocessing.get_context('forkserver')
+_context.set_forkserver_preload([__name__])
+
+# ---------------------------------------------------------------------------
+def _init_worker():
+    """ Initialize a worker process: build and draw the chart templates up front
+
+    The first draw of a figure loads the fonts; it's done before the first request.
+    """
+    for kind in covid19_charts.CHARTS:
+        covid19_charts.get_template(kind).canvas.draw()
+
+# ---------------------------------------------------------------------------
+def _render(kind, data, fmt):
+    """ Render one chart in the worker process """
+    return covid19_charts.render(kind, data, fmt)
+
+# ---------------------------------------------------------------------------
+class RenderPool(object):
+    """ Pool of worker processes to render the charts concurrently
+
+    Call "start()" in the process that uses the pool - for gunicorn in the
+    worker, after the fork: each worker gets its own pool. If the pool
+    fails or a render takes longer than "timeout" seconds, the chart is
+    rendered in the calling process and the pool is restarted on next use.
+    """
+
+    def __init__(self, processes, timeout=10):
+        self._processes = processes
+        self._timeout = timeout
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        """ Get the pool of the current process - start it if required """
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                log.info('starting render pool; processes=%d', self._processes)
+                self._pool = _context.Pool(self._processes, initializer=_init_worker)
+                self._pid = os.getpid()
+            return self._pool
+
+    def start(self):
+        """ Start the worker processes; they build the chart templates right away """
+        self._get_pool()
+
+    def _reset(self):
+        """ Stop the pool; a new one is started on next use """
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.terminate()
+            self._pool = None
+
+    def render(self, kinds, data, fmt='png'):
+        """ Render the charts "kinds" for the data; returns a dict: kind --> PNG (or SVG) bytes """
+        log.debug('> kinds=%s fmt=%s', kinds, fmt)
+        # send compact, contiguous numpy arrays to the workers
+        arrays = { name: np.ascontiguousarray(values) for name, values in data.items() }
+        results = {}
+        try:
+            pool = self._get_pool()
+            pending = { kind: pool.apply_async(_render, (kind, arrays, fmt)) for kind in kinds }
+            for kind, result in pending.items():
+                results[kind] = result.get(self._timeout)
+        except Exception:
+            log.exception('render pool failed - rendering in process')
+            self._reset()
+
+        # fallback: render what's missing in the calling process
+        for kind in kinds:
+            if kind not in results:
+                results[kind] = covid19_charts.render(kind, data, fmt)
+        log.debug('<')
+        return results
+
+    def close(self):
+        """ Stop the worker processes """
+        self._reset()
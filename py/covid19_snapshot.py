@@ -0,0 +1,154 @@
+# on-disk snapshot of the dataset
+#
+# Layout of the snapshot directory:
+#
+#   CURRENT               - name of the sub-directory of the current snapshot
+#   <version>.<pid>/      - one sub-directory per written snapshot
+#       header.json       - version, creation time, names of the arrays
+#       <array>.npy       - one file per array of the table - and of its
+#                           metrics (see covid19_metrics), if computed
+#
+# The arrays are loaded with "np.load(mmap_mode='r')": all processes that
+# load the same snapshot share the pages through the OS page cache.
+import os
+import json
+import time
+import shutil
+import logging
+import numpy as np
+
+from covid19_table import CovidTable
+from covid19_metrics import CovidMetrics
+
+log = logging.getLogger(__name__)
+
+# snapshot directory used if none is configured
+DEFAULT_DIRECTORY = '/tmp/covid19_snapshot'
+
+# number of snapshots kept in the directory - processes may still use older ones
+KEEP_SNAPSHOTS = 3
+
+# ---------------------------------------------------------------------------
+def write_snapshot(table, directory):
+    """ Write the table into a new snapshot and make it the current one; returns the header """
+    log.debug('> version=%s', table.version)
+    os.makedirs(directory, exist_ok=True)
+    name = '%s.%d' % (table.version, os.getpid())
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    columns, index = table.column_arrays(), table.index_arrays()
+    metrics = table.metrics.arrays() if table.metrics is not None else {}
+    for prefix, arrays in (('column', columns), ('index', index), ('metrics', metrics)):
+        for array_name, array in arrays.items():
+            np.save(os.path.join(path, '%s.%s.npy' % (prefix, array_name)), np.ascontiguousarray(array))
+    header = {'version': table.version, 'created': time.time(), 'columns': sorted(columns), 'index': sorted(index)
+             ,'metrics': sorted(metrics)}
+    with open(os.path.join(path, 'header.json'), 'w') as f:
+        json.dump(header, f)
+
+    # switch to the new snapshot - os.replace is atomic
+    current = os.path.join(directory, 'CURRENT')
+    with open(current + '.%d' % os.getpid(), 'w') as f:
+        f.write(name)
+    os.replace(current + '.%d' % os.getpid(), current)
+    _remove_old_snapshots(directory)
+    log.debug('< path=%s', path)
+    header['path'] = path
+    return header
+
+# ---------------------------------------------------------------------------
+def _remove_old_snapshots(directory):
+    """ Remove all but the newest snapshots """
+    snapshots = sorted((entry for entry in os.listdir(directory) if os.path.isdir(os.path.join(directory, entry)))
+                      ,key=lambda entry: os.path.getmtime(os.path.join(directory, entry)))
+    for entry in snapshots[:-KEEP_SNAPSHOTS]:
+        # processes using the snapshot keep their mapping of the files
+        shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+# ---------------------------------------------------------------------------
+def read_header(directory):
+    """ Return the header of the current snapshot (plus its "path"); None if there is none """
+    try:
+        with open(os.path.join(directory, 'CURRENT')) as f:
+            path = os.path.join(directory, f.read().strip())
+        with open(os.path.join(path, 'header.json')) as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None
+    header['path'] = path
+    return header
+
+# ---------------------------------------------------------------------------
+def read_snapshot(header):
+    """ Load the table of a snapshot - with its metrics, if stored; the arrays are memory-mapped """
+    log.debug('> path=%s', header['path'])
+    def load(prefix, array_name):
+        return np.load(os.path.join(header['path'], '%s.%s.npy' % (prefix, array_name)), mmap_mode='r')
+    columns = {array_name: load('column', array_name) for array_name in header['columns']}
+    index = {array_name: load('index', array_name) for array_name in header['index']}
+    table = CovidTable(index=index, **columns)
+    if header.get('metrics'):
+        table.metrics = CovidMetrics(table, arrays={array_name: load('metrics', array_name) for array_name in header['metrics']})
+    log.debug('< version=%s metrics=%s', table.version, table.metrics is not None)
+    return table
+
+# ---------------------------------------------------------------------------
+class SnapshotLoader(object):
+    """ Loader of the dataset store that uses a snapshot on disk
+
+    * if the current snapshot is younger than "max_age" seconds, the
+      snapshot is used; no download
+    * otherwise the "loader" is called. A new version is written into a
+      snapshot and loaded from there - the process uses the shared pages.
+      The metrics of the table are written as well; wrap the loader with
+      covid19_metrics.MetricsLoader to compute them before.
+    """
+
+    def __init__(self, loader, directory, max_age):
+        self._loader = loader
+        self._directory = directory
+        self._max_age = max_age
+
+    def __call__(self, previous):
+        header = read_header(self._directory)
+        if header is not None and time.time() - header['created'] < self._max_age:
+            if previous is not None and previous.version == header['version']:
+                return previous, previous.version
+            try:
+                table = read_snapshot(header)
+                return table, table.version
+            except (OSError, ValueError, KeyError):
+                # a damaged snapshot or removed while loading - load from the source
+                log.exception('failed to read snapshot; path=%s', header['path'])
+
+        table, version = self._loader(previous)
+        if previous is None or version != previous.version:
+            try:
+                table = read_snapshot(write_snapshot(table, self._directory))
+            except (OSError, ValueError, KeyError):
+                log.exception('failed to write snapshot; directory=%s', self._directory)
+        return table, table.version
+
+# ---------------------------------------------------------------------------
+class SnapshotAttacher(object):
+    """ Loader of the dataset store for workers in "shared" mode
+
+    The worker never reads the data source. A separate refresher process
+    (see covid19_refresher) publishes new versions as snapshots; the loader
+    attaches to the current snapshot whenever its version changed.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def __call__(self, previous):
+        header = read_header(self._directory)
+        if header is None:
+            raise IOError('no snapshot found; directory=%s' % self._directory)
+        if previous is not None and previous.version == header['version']:
+            return previous, previous.version
+        table = read_snapshot(header)
+        return table, table.version
@@ -0,0 +1,170 @@
+# data sources of the dataset
+#
+# A loader is a callable "loader(previous) -> (table, version)": it gets
+# the table of the previous call (or None) and returns the current table.
+# If the data source did not change, it returns the previous table.
+#
+# Loaders (APP_CONFIG: Dataset.Source):
+#   datahub - the combined CSV file read from Dataset.Url; see covid19_ingest
+#   local   - a combined CSV file or a directory of them (Dataset.Path);
+#             e.g. a local mirror of the datahub file; ".csv.gz" files are
+#             decompressed while they are parsed
+#   jhu     - the wide CSV files of JHU CSSE: one row per country/province,
+#             one column per date (Dataset.Jhu.Confirmed/Deaths/Recovered)
+import os
+import csv
+import gzip
+import hashlib
+import logging
+import numpy as np
+
+import service_utl
+import covid19_fetch
+import covid19_ingest
+import covid19_timing
+from covid19_table import CovidTable
+
+log = logging.getLogger(__name__)
+
+# JHU CSSE time series - global
+JHU_BASE_URL = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/'
+JHU_URLS = { 'confirmed': JHU_BASE_URL + 'time_series_covid19_confirmed_global.csv'
+           , 'deaths': JHU_BASE_URL + 'time_series_covid19_deaths_global.csv'
+           , 'recovered': JHU_BASE_URL + 'time_series_covid19_recovered_global.csv'
+           }
+
+# ---------------------------------------------------------------------------
+class LocalCsvLoader(object):
+    """ Loader for combined CSV files on the local disk
+
+    "path" is a file or a directory; all "*.csv" and "*.csv.gz" files of a
+    directory are read (e.g. one file per month). The files are read again only if one of
+    them changed (name, size, modification time).
+    """
+
+    def __init__(self, path, chunk_size=1024*1024):
+        self._path = path
+        self._chunk_size = chunk_size
+        self._signature = None
+
+    def _files(self):
+        if os.path.isdir(self._path):
+            return sorted(os.path.join(self._path, name) for name in os.listdir(self._path) if name.endswith(('.csv', '.csv.gz')))
+        return [self._path]
+
+    def __call__(self, previous):
+        files = self._files()
+        signature = [ (name, os.stat(name).st_size, os.stat(name).st_mtime_ns) for name in files ]
+        if previous is not None and signature == self._signature:
+            log.debug('< not modified')
+            return previous, previous.version
+
+        log.debug('> files=%d', len(files))
+        tables = []
+        with covid19_timing.stage('parse'):
+            for name in files:
+                with (gzip.open(name, 'rb') if name.endswith('.gz') else open(name, 'rb')) as f:
+                    tables.append(CovidTable.from_csv(covid19_ingest.LineReader(f, self._chunk_size)))
+        table = tables[0] if len(tables) == 1 else CovidTable.concat(tables)
+        self._signature = signature
+        log.debug('< rows=%d', len(table))
+        return table, table.version
+
+# ---------------------------------------------------------------------------
+def _parse_jhu_date(text):
+    """ Convert a JHU date "m/d/yy" into an ISO date """
+    month, day, year = text.split('/')
+    return '%04d-%02d-%02d' % (2000 + int(year) if len(year) == 2 else int(year), int(month), int(day))
+
+# ---------------------------------------------------------------------------
+def parse_jhu(text):
+    """ Parse a wide JHU CSV file
+
+    Structure: Province/State,Country/Region,Lat,Long,<date>,<date>,...
+    Returns the tuple (keys, dates, values): the (country, province) of
+    each row, the dates as datetime64[D] and the matrix [row, date].
+    """
+    rows = list(csv.reader(text.splitlines()))
+    header, rows = rows[0], [ row for row in rows[1:] if len(row) > 4 ]
+    dates = np.array([ _parse_jhu_date(column) for column in header[4:] ], dtype='datetime64[D]')
+    keys = [ (row[1], row[0]) for row in rows ]
+    values = np.array([ row[4:4 + len(dates)] for row in rows ])
+    # some cells are empty or contain floats
+    values[values == ''] = '0'
+    return keys, dates, values.astype(np.float64).astype(np.int64)
+
+# ---------------------------------------------------------------------------
+def jhu_to_table(confirmed, deaths, recovered):
+    """ Reshape the three wide JHU files into the columnar table
+
+    The arguments are the results of "parse_jhu". The files may contain
+    different rows: e.g. some countries report the recovered persons for
+    the whole country only. The table gets one row for each key and date.
+    """
+    keys = sorted(set(confirmed[0]) | set(deaths[0]) | set(recovered[0]))
+    key_index = {key: ix for ix, key in enumerate(keys)}
+    dates = confirmed[1]
+
+    # one matrix [key, date] per column; rows missing in a file stay 0
+    columns = {}
+    for name, (file_keys, file_dates, values) in (('confirmed', confirmed), ('deaths', deaths), ('recovered', recovered)):
+        matrix = np.zeros((len(keys), len(dates)), dtype=np.int64)
+        date_index = np.searchsorted(dates, file_dates)
+        known = (date_index < len(dates))
+        known[known] = dates[date_index[known]] == file_dates[known]
+        rows = np.array([ key_index[key] for key in file_keys ], dtype=np.int64)
+        matrix[rows[:, np.newaxis], date_index[known][np.newaxis, :]] = values[:, known]
+        columns[name] = matrix.reshape(-1)
+
+    # wide --> long: key-major, one row per date
+    countries, key_country = np.unique(np.array([ country for country, province in keys ]), return_inverse=True)
+    return CovidTable(date=np.tile(dates, len(keys))
+                     ,country_code=np.repeat(key_country, len(dates)).astype(np.int32)
+                     ,countries=countries
+                     ,confirmed=columns['confirmed']
+                     ,recovered=columns['recovered']
+                     ,deaths=columns['deaths'])
+
+# ---------------------------------------------------------------------------
+class JhuLoader(object):
+    """ Loader for the wide CSV files of JHU CSSE
+
+    The three files are downloaded on each call; they are parsed only if
+    their content changed.
+    """
+
+    def __init__(self, urls=None, fetcher=None):
+        self._urls = urls or JHU_URLS
+        self._fetcher = fetcher or covid19_fetch.HttpFetcher()
+        self._digest = None
+
+    def __call__(self, previous):
+        log.debug('> urls=%s', self._urls)
+        with covid19_timing.stage('fetch'):
+            bodies = { name: self._fetcher.fetch_bytes(self._urls[name]) for name in ('confirmed', 'deaths', 'recovered') }
+        digest = hashlib.sha1(b''.join(hashlib.sha1(bodies[name]).digest() for name in sorted(bodies))).hexdigest()
+        if previous is not None and digest == self._digest:
+            log.debug('< not modified')
+            return previous, previous.version
+
+        with covid19_timing.stage('parse'):
+            parsed = { name: parse_jhu(body.decode('utf-8')) for name, body in bodies.items() }
+            table = jhu_to_table(parsed['confirmed'], parsed['deaths'], parsed['recovered'])
+        self._digest = digest
+        log.debug('< rows=%d', len(table))
+        return table, table.version
+
+# ---------------------------------------------------------------------------
+def create_loader(config):
+    """ Create the loader of the data source using the application configuration """
+    source = service_utl.get_config_value(config, 'Dataset.Source', 'datahub')
+    log.info('data source: %s', source)
+    if source == 'local':
+        return LocalCsvLoader(service_utl.get_config_value(config, 'Dataset.Path')
+                ,chunk_size=service_utl.get_config_value(config, 'Dataset.ChunkSize', 1024*1024))
+    if source == 'jhu':
+        urls = { name: service_utl.get_config_value(config, 'Dataset.Jhu.%s' % name.capitalize(), url) for name, url in JHU_URLS.items() }
+        return JhuLoader(urls, fetcher=covid19_fetch.create_fetcher(config))
+    if source == 'datahub':
+        return covid19_ingest.create_ingest(config)
+    raise ValueError('unknown data source: %s' % source)
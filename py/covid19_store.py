@@ -0,0 +1,145 @@
+# dataset store
+import time
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+class DatasetUnavailableError(Exception):
+    """ Raised if no dataset has been loaded so far and the source is down """
+    pass
+
+# ---------------------------------------------------------------------------
+class DatasetStore(object):
+    """ Process-wide, in-memory cache for a dataset
+
+    The store calls the "loader" to get the data. The loader is a callable
+    that gets the current data (None on the first call) and returns a
+    tuple: (data, version)
+
+    * the first call of "get()" loads the data - all other callers wait for it
+      and get its result; if it failed, they fail as well - they do not
+      load again one after the other
+    * after "ttl" seconds the data is stale. The next call of "get()" starts
+      a refresh in a background thread and returns the last good copy
+      (stale-while-revalidate)
+    * if a refresh fails, the last good copy is kept and the next refresh is
+      started after "retry_interval" seconds
+
+    Listeners registered with "add_listener()" are called with the new
+    version after each refresh that changed the version.
+    """
+
+    def __init__(self, loader, ttl=3600, retry_interval=60):
+        self._loader = loader
+        self._ttl = ttl
+        self._retry_interval = retry_interval
+
+        self._data = None
+        self._version = None
+        self._loaded_at = None
+        self._next_refresh = 0.0
+        # number of finished loads - successful or not
+        self._generation = 0
+        self._refresh_thread = None
+        self._listeners = []
+
+        # _lock protects the state, _load_lock makes sure only one load runs at a time
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+        # counters
+        self._hits, self._stale_hits, self._misses = 0, 0, 0
+        self._refreshes, self._refresh_errors = 0, 0
+
+    @property
+    def version(self):
+        """ Version of the current data; None if nothing has been loaded """
+        return self._version
+
+    def add_listener(self, listener):
+        """ Register a callable; it's called with the new version after a refresh """
+        self._listeners.append(listener)
+
+    def get(self):
+        """ Return the data
+
+        Raises DatasetUnavailableError if there is no data and the loader failed.
+        """
+        with self._lock:
+            if self._data is not None:
+                if time.time() >= self._next_refresh:
+                    self._stale_hits += 1
+                    self._start_background_refresh()
+                else:
+                    self._hits += 1
+                return self._data
+            self._misses += 1
+            # the source failed recently - do not hammer it with every request
+            if time.time() < self._next_refresh:
+                raise DatasetUnavailableError('dataset not loaded - source failed')
+
+        # nothing loaded so far - load in the calling thread
+        self.refresh()
+        if self._data is None:
+            raise DatasetUnavailableError('dataset not loaded - source failed')
+        return self._data
+
+    def refresh(self):
+        """ Load the data using the loader; keep the old data on errors """
+        generation = self._generation
+        with self._load_lock:
+            # a load finished while we waited for the lock - with or without data
+            if self._generation != generation:
+                return
+            # the data may have been loaded before
+            if self._data is not None and time.time() < self._next_refresh:
+                return
+            log.info('refreshing dataset; current version=%s', self._version)
+            started = time.time()
+            try:
+                data, version = self._loader(self._data)
+            except Exception:
+                log.exception('refresh failed; keeping version=%s', self._version)
+                with self._lock:
+                    self._refresh_errors += 1
+                    self._next_refresh = time.time() + self._retry_interval
+                    self._generation += 1
+                return
+
+            with self._lock:
+                changed = version != self._version
+                self._data, self._version = data, version
+                self._loaded_at = time.time()
+                self._next_refresh = self._loaded_at + self._ttl
+                self._refreshes += 1
+                self._generation += 1
+            log.info('dataset refreshed; version=%s duration=%.3fs', version, time.time() - started)
+
+        # inform the listeners - outside the lock
+        if changed:
+            for listener in self._listeners:
+                try:
+                    listener(version)
+                except Exception:
+                    log.exception('listener failed; version=%s', version)
+
+    def _start_background_refresh(self):
+        """ Start the refresh thread - if not running. Caller must hold _lock """
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        self._refresh_thread = threading.Thread(target=self.refresh, name='refresh', daemon=True)
+        self._refresh_thread.start()
+
+    def stats(self):
+        """ Return the counters of the store as dict """
+        with self._lock:
+            return {'version': self._version
+                   ,'age': None if self._loaded_at is None else round(time.time() - self._loaded_at, 3)
+                   ,'hits': self._hits
+                   ,'stale_hits': self._stale_hits
+                   ,'misses': self._misses
+                   ,'refreshes': self._refreshes
+                   ,'refresh_errors': self._refresh_errors
+                   }
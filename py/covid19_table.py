@@ -0,0 +1,257 @@
+# columnar covid19 table
+import csv
+import hashlib
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+def _to_int64(values):
+    """ Convert a sequence of strings into an int64 array; empty strings become 0 """
+    return np.fromiter((int(value) if value else 0 for value in values), dtype=np.int64, count=len(values))
+
+# ---------------------------------------------------------------------------
+class CovidTable(object):
+    """ Columnar in-memory table of the combined CSV file
+
+    The table is built once for each version of the data-source. It has
+    the following columns; all of them are numpy arrays of the same length:
+        date         - datetime64[D]
+        country_code - int32; index into the sorted array "countries"
+        confirmed    - int64; accumulated registered cases
+        recovered    - int64; accumulated number of recovered persons
+        deaths       - int64; accumulated number of death
+    """
+
+    def __init__(self, date, country_code, countries, confirmed, recovered, deaths, index=None):
+        """ Create the table from the columns
+
+        "index" are the arrays returned by "index_arrays()" of a table with
+        the same columns; if not given, the index is built from the columns.
+        """
+        self.date = date
+        self.country_code = country_code
+        self.countries = countries
+        self.confirmed = confirmed
+        self.recovered = recovered
+        self.deaths = deaths
+        # the sorted list of country names and the lookup: upper-case country name --> country code
+        self.country_names = countries.tolist()
+        self._codes = {name.upper(): code for code, name in enumerate(self.country_names)}
+        # derived metrics (see covid19_metrics) - computed by the loader
+        self.metrics = None
+        # the version is computed on first use; see "version"
+        self._version = None
+        if index is None:
+            self._build_index()
+        else:
+            self.days, self._first, self._last = index['days'], index['first'], index['last']
+            self._series = {name: index[name] for name in ('confirmed', 'recovered', 'deaths')}
+
+    def column_arrays(self):
+        """ Return the columns as dict: name --> numpy array """
+        return {'date': self.date, 'country_code': self.country_code, 'countries': self.countries
+               ,'confirmed': self.confirmed, 'recovered': self.recovered, 'deaths': self.deaths}
+
+    def index_arrays(self):
+        """ Return the arrays of the index as dict: name --> numpy array """
+        result = {'days': self.days, 'first': self._first, 'last': self._last}
+        result.update(self._series)
+        return result
+
+    def _build_index(self):
+        """ Build the per-country series
+
+        For each column we build a matrix [country_code, day] with one row
+        per country and one column per day between the first and the last
+        date of the table. The values of all provinces of a country are
+        summed up. Days without a report are filled with the value of the
+        previous day (the values are accumulated).
+        """
+        log.debug('>')
+        if len(self) == 0:
+            self.days = np.array([], dtype='datetime64[D]')
+            self._first, self._last = np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+            self._series = {name: np.zeros((0, 0), dtype=np.int64) for name in ('confirmed', 'recovered', 'deaths')}
+            log.debug('< empty table')
+            return
+        self.days = np.arange(self.date.min(), self.date.max() + 1)
+        shape = (len(self.countries), len(self.days))
+        day_index = (self.date - self.days[0]).astype(np.int64)
+        flat_index = self.country_code * shape[1] + day_index
+
+        # mark the days with a report; get the first+last report of each country
+        reported = np.zeros(shape, dtype=bool)
+        reported.flat[flat_index] = True
+        self._first = np.argmax(reported, axis=1)
+        self._last = shape[1] - 1 - np.argmax(reported[:, ::-1], axis=1)
+
+        # index of the last reported day for each day - used to fill the gaps
+        fill_index = np.maximum.accumulate(np.where(reported, np.arange(shape[1]), 0), axis=1)
+        rows = np.arange(shape[0])[:, np.newaxis]
+
+        self._series = {}
+        for name in ('confirmed', 'recovered', 'deaths'):
+            values = np.zeros(shape, dtype=np.int64)
+            np.add.at(values.reshape(-1), flat_index, getattr(self, name))
+            self._series[name] = values[rows, fill_index]
+        log.debug('< countries=%d days=%d', shape[0], shape[1])
+
+    @classmethod
+    def from_csv(cls, lines, header=True):
+        """ Parse the combined CSV file
+
+        "lines" is an iterable of text lines. If "header" is set, the first
+        line is the header and skipped:
+
+            Date,Country/Region,Province/State,Lat,Long,Confirmed,Recovered,Deaths
+        """
+        log.debug('>')
+        rd = csv.reader(lines)
+        if header:
+            next(rd, None) # skip first line
+        # collect the used columns; the rows are dropped right away
+        date, country, confirmed, recovered, deaths = [], [], [], [], []
+        for row in rd:
+            date.append(row[0])
+            country.append(row[1])
+            confirmed.append(row[5])
+            recovered.append(row[6])
+            deaths.append(row[7])
+        if len(date) == 0:
+            return cls.empty()
+
+        countries, country_code = np.unique(np.array(country), return_inverse=True)
+        table = cls(date=np.array(date, dtype='datetime64[D]')
+                   ,country_code=country_code.astype(np.int32)
+                   ,countries=countries
+                   ,confirmed=_to_int64(confirmed)
+                   ,recovered=_to_int64(recovered)
+                   ,deaths=_to_int64(deaths))
+        log.debug('< rows=%d countries=%d', len(table), len(countries))
+        return table
+
+    @classmethod
+    def empty(cls):
+        """ Create a table without rows """
+        return cls(date=np.array([], dtype='datetime64[D]'), country_code=np.array([], dtype=np.int32)
+                  ,countries=np.array([], dtype=str), confirmed=np.array([], dtype=np.int64)
+                  ,recovered=np.array([], dtype=np.int64), deaths=np.array([], dtype=np.int64))
+
+    def __len__(self):
+        return len(self.date)
+
+    @property
+    def last_date(self):
+        """ The last date of the table; None for an empty table """
+        return self.days[-1] if len(self.days) > 0 else None
+
+    def rows_before(self, date):
+        """ Return a new table with the rows before "date" """
+        mask = self.date < date
+        return CovidTable(self.date[mask], self.country_code[mask], self.countries
+                         ,self.confirmed[mask], self.recovered[mask], self.deaths[mask])
+
+    def append(self, other):
+        """ Return a new table with the rows of this table followed by the rows of "other"
+
+        The rows are not parsed again; the country codes of both tables are
+        mapped to the merged list of countries and the series are rebuilt.
+        """
+        return CovidTable.concat([self, other])
+
+    @classmethod
+    def concat(cls, tables):
+        """ Return a new table with the rows of all tables; see "append" """
+        if len(tables) == 0:
+            return cls.empty()
+        countries = tables[0].countries
+        for table in tables[1:]:
+            countries = np.union1d(countries, table.countries)
+        return cls(np.concatenate([table.date for table in tables])
+                  ,np.concatenate([np.searchsorted(countries, table.countries)[table.country_code] for table in tables]).astype(np.int32)
+                  ,countries
+                  ,np.concatenate([table.confirmed for table in tables])
+                  ,np.concatenate([table.recovered for table in tables])
+                  ,np.concatenate([table.deaths for table in tables]))
+
+    @property
+    def version(self):
+        """ Version of the table: "<last date>-<digest of the content>"
+
+        The digest covers the countries, the days and the per-country
+        series: a correction of the numbers of a day gives a new version -
+        also if the number of rows and the last date did not change. The
+        order of the rows does not matter.
+        """
+        if self._version is None:
+            digest = hashlib.sha1('\n'.join(self.country_names).encode('utf-8'))
+            digest.update(np.ascontiguousarray(self.days).view(np.uint8))
+            for name in ('confirmed', 'recovered', 'deaths'):
+                digest.update(np.ascontiguousarray(self._series[name]).view(np.uint8))
+            self._version = '%s-%s' % (self.last_date if self.last_date is not None else '', digest.hexdigest()[:16])
+        return self._version
+
+    def date_range(self, country):
+        """ Return the first and the last date of the series of a country; None if unknown """
+        code = self._codes.get(country.upper())
+        if code is None:
+            return None
+        return self.days[self._first[code]], self.days[self._last[code]]
+
+    def matrix(self, name):
+        """ Get the matrix [country_code, day] of the column "name" (confirmed, recovered, deaths) """
+        return self._series[name]
+
+    def window(self, country, start_date=None, end_date=None):
+        """ Locate the series of a country in the matrices
+
+        Returns the tuple (country code, first day, last day + 1) of the days
+        from "start_date" until "end_date" (included); None if the country
+        is unknown.
+        """
+        code = self._codes.get(country.upper())
+        if code is None:
+            return None
+        return (code,) + self.span([code], start_date, end_date)
+
+    def codes(self, countries):
+        """ Get the country codes of a list of countries as int array; unknown countries are skipped """
+        codes = (self._codes.get(country.strip().upper()) for country in countries)
+        return np.array([ code for code in codes if code is not None ], dtype=np.int64)
+
+    def span(self, codes, start_date=None, end_date=None):
+        """ Locate the series of several countries in the matrices
+
+        "codes" is a non-empty list of country codes. Returns the tuple
+        (first day, last day + 1) of the days from "start_date" until
+        "end_date" (included) from the first report of any of the countries
+        until the last one. Slicing the rows "codes" of a matrix with these
+        days gets the series of all countries at once.
+        """
+        codes = np.asarray(codes)
+        start, stop = self._first[codes].min(), self._last[codes].max() + 1
+        if start_date is not None:
+            start = max(start, np.searchsorted(self.days, start_date))
+        if end_date is not None:
+            stop = min(stop, np.searchsorted(self.days, end_date, side='right'))
+        return start, stop
+
+    def series(self, country, start_date=None, end_date=None):
+        """ Get the series of one country from "start_date" until "end_date" (included)
+
+        Returns a dict with the arrays: date, confirmed, recovered, deaths.
+        The arrays are read-only views; one value per day, sorted by date.
+        Returns None, if the country is unknown.
+        """
+        window = self.window(country, start_date, end_date)
+        if window is None:
+            return None
+        code, start, stop = window
+        result = {'date': self.days[start:stop]}
+        for name, values in self._series.items():
+            result[name] = values[code, start:stop]
+        for values in result.values():
+            values.flags.writeable = False
+        return result
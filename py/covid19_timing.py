@@ -0,0 +1,119 @@
+# timing of the processing stages
+#
+# The durations of the stages (fetch, parse, metrics, filter, render, ...)
+# are collected in histograms for the "/metrics" endpoint. If a request is
+# processed by the thread, the stages are also recorded for the request;
+# they are sent to the client in the "Server-Timing" header.
+import time
+import threading
+import contextlib
+
+# upper bounds of the buckets of the histograms - in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# ---------------------------------------------------------------------------
+class Histogram(object):
+    """ Number of observed values per bucket; plus count and sum """
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for ix, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[ix] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+# the histograms: (metric name, label value) --> Histogram
+_histograms = {}
+_lock = threading.Lock()
+# the stages of the current request of the thread
+_request = threading.local()
+
+# ---------------------------------------------------------------------------
+def observe(metric, label, seconds):
+    """ Add a duration to the histogram of the metric """
+    with _lock:
+        histogram = _histograms.get((metric, label))
+        if histogram is None:
+            histogram = _histograms[(metric, label)] = Histogram()
+        histogram.observe(seconds)
+
+# ---------------------------------------------------------------------------
+def record(name, seconds):
+    """ Record the duration of a stage """
+    observe('stage', name, seconds)
+    stages = getattr(_request, 'stages', None)
+    if stages is not None:
+        stages.append((name, seconds))
+
+# ---------------------------------------------------------------------------
+@contextlib.contextmanager
+def stage(name):
+    """ Record the duration of the "with" block as stage "name" """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+# ---------------------------------------------------------------------------
+def start_request():
+    """ Start to record the stages of a request in the current thread """
+    _request.stages = []
+    _request.start = time.perf_counter()
+
+# ---------------------------------------------------------------------------
+def end_request(endpoint):
+    """ Stop recording; returns the header value "Server-Timing" of the request """
+    stages = getattr(_request, 'stages', None)
+    if stages is None:
+        return None
+    total = time.perf_counter() - _request.start
+    _request.stages = None
+    observe('request', endpoint or '', total)
+
+    # one entry per stage; the durations of repeated stages are summed up
+    durations = {}
+    for name, seconds in stages:
+        durations[name] = durations.get(name, 0) + seconds
+    durations['total'] = total
+    return ', '.join('%s;dur=%.1f' % (name, seconds * 1000) for name, seconds in durations.items())
+
+# ---------------------------------------------------------------------------
+def prometheus_text(counters=None):
+    """ Return the histograms in the Prometheus text format
+
+    "counters" is an optional dict: metric name --> dict of counters
+    (like "stats()" of the dataset store); numeric values are added as
+    gauges "covid19_<metric name>_<counter>".
+    """
+    lines = []
+    with _lock:
+        histograms = sorted((key, (list(h.counts), h.count, h.sum)) for key, h in _histograms.items())
+    for metric, label_name, help_text in (('stage', 'stage', 'duration of the processing stages')
+                                         ,('request', 'endpoint', 'duration of the requests')):
+        name = 'covid19_%s_seconds' % metric
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s histogram' % name)
+        for (key_metric, label), (counts, count, total) in histograms:
+            if key_metric != metric:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket{%s="%s",le="%s"} %d' % (name, label_name, label, bound, cumulative))
+            lines.append('%s_bucket{%s="%s",le="+Inf"} %d' % (name, label_name, label, count))
+            lines.append('%s_sum{%s="%s"} %f' % (name, label_name, label, total))
+            lines.append('%s_count{%s="%s"} %d' % (name, label_name, label, count))
+
+    for metric, values in (counters or {}).items():
+        for counter, value in sorted(values.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append('# TYPE covid19_%s_%s gauge' % (metric, counter))
+                lines.append('covid19_%s_%s %s' % (metric, counter, value))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,78 @@
+# cache warmer
+#
+# After each refresh of the dataset the caches are empty. The warmer
+# creates the pages of the configured keys and of the most requested keys
+# in a background thread - before the next visitors ask for them.
+import logging
+import threading
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+# maximum number of keys counted by "record()"
+MAX_TRACKED_KEYS = 10000
+
+# ---------------------------------------------------------------------------
+class CacheWarmer(object):
+    """ Create the pages of the popular keys after each new dataset version
+
+    "warm_page" is called with a key (e.g. (country, timespan)) and the
+    version; it creates the page and stores it in the caches. The keys are
+    * the configured "keys"
+    * plus the "top_n" most requested keys - see "record()"
+    """
+
+    def __init__(self, warm_page, keys=(), top_n=0):
+        self._warm_page = warm_page
+        self._keys = list(keys)
+        self._top_n = top_n
+        self._requests = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        # counters
+        self._runs, self._pages, self._errors = 0, 0, 0
+
+    def record(self, key):
+        """ Count a request of a page """
+        if self._top_n > 0:
+            with self._lock:
+                self._requests[key] += 1
+                if len(self._requests) > MAX_TRACKED_KEYS:
+                    # forget the keys requested least
+                    self._requests = Counter(dict(self._requests.most_common(MAX_TRACKED_KEYS // 2)))
+
+    def keys(self):
+        """ The keys to warm: the configured keys, then the most requested keys """
+        with self._lock:
+            top = [ key for key, _ in self._requests.most_common(self._top_n) ] if self._top_n > 0 else []
+        return self._keys + [ key for key in top if key not in self._keys ]
+
+    def warm(self, version):
+        """ Create the pages of all keys - called in the background thread """
+        log.info('warming caches; version=%s', version)
+        for key in self.keys():
+            try:
+                self._warm_page(key, version)
+                self._pages += 1
+            except Exception:
+                self._errors += 1
+                log.exception('failed to warm page; key=%s', key)
+        self._runs += 1
+        log.info('caches warmed; version=%s', version)
+
+    def start(self, version):
+        """ Warm the caches in a background thread; listener of the dataset store """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                # the running thread creates the pages of the older version;
+                # the pages of the new version are created on request
+                log.warning('cache warmer still running; version=%s', version)
+                return
+            self._thread = threading.Thread(target=self.warm, args=(version,), name='warmer', daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        """ Return the counters of the warmer as dict """
+        with self._lock:
+            return {'keys': len(self._keys), 'top_n': self._top_n, 'tracked': len(self._requests)
+                   ,'runs': self._runs, 'pages': self._pages, 'errors': self._errors}
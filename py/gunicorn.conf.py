@@ -0,0 +1,42 @@
+# gunicorn configuration - loaded by gunicorn from the working directory
+import os
+import sys
+import subprocess
+
+import service_utl
+
+# the refresher process started by "when_ready"
+refresher = None
+
+# ---------------------------------------------------------------------------
+def when_ready(server):
+    """ Start the refresher of the shared dataset as child process of the master
+
+    Only used in "shared" mode (APP_CONFIG: Dataset.Mode="shared"); set
+    Dataset.Refresher="sidecar" to run covid19_refresher on your own.
+
+    The refresher must not run as a thread of the master: the master forks
+    the workers - a thread holding a lock (logging, imports) at the time of
+    the fork leaves the lock locked in the worker. The downloads and the
+    parsing do not use the CPU of the master either.
+    """
+    global refresher
+    config = service_utl.get_app_config()
+    if service_utl.get_config_value(config, 'Dataset.Mode', 'local') != 'shared':
+        return
+    if service_utl.get_config_value(config, 'Dataset.Refresher', 'master') != 'master':
+        return
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'covid19_refresher.py')
+    refresher = subprocess.Popen([sys.executable, script, '--parent', str(os.getpid())])
+    server.log.info('started refresher of the shared dataset; pid=%d', refresher.pid)
+
+# ---------------------------------------------------------------------------
+def on_exit(server):
+    """ Stop the refresher process """
+    if refresher is not None and refresher.poll() is None:
+        server.log.info('stopping refresher; pid=%d', refresher.pid)
+        refresher.terminate()
+        try:
+            refresher.wait(10)
+        except subprocess.TimeoutExpired:
+            refresher.kill()
@@ -1,5 +1,5 @@
-from kool.jsonencoder  import JSONEncoder, jsonify, jsonproperty, jsoncollection
-from kool.jsonreader import json_to_object, get_json_attribute
+from kool.jsonencoder  import JSONEncoder, JSONStream, jsonify, jsonify_iter, jsonproperty, jsoncollection
+from kool.jsonreader import json_to_object, get_json_attribute, compile_json_path, JSONPath, JSONObject, JSONArray
 from kool.jsonlink import JSONLink
 from kool.jsonhaldocument import JSONHalDocument, jsonify_as_hal
 
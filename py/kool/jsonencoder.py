@@ -2,6 +2,8 @@
 import json
 import logging
 import inspect
+import threading
+import weakref
 
 log = logging.getLogger(__name__)
 
@@ -13,6 +15,75 @@ class jsoncollection(property):
     """ Marker-Class for a collection of properties to be serialized into a JSON document """
     pass
 
+# cache of the property names: class --> { marker_class: tuple of property names }
+# The classes are weak keys: dynamically created classes are removed with the class.
+_property_names_cache = weakref.WeakKeyDictionary()
+_property_names_lock = threading.Lock()
+
+def _get_class_property_names(cls, marker_class):
+    """ get the names of all properties of the class "cls" marked with "marker_class"
+
+    The names are searched once per class and marker class. We loop all
+    classes of "cls" in method resolution order and collect every name
+    marked with "marker_class" in any of them, each name once.
+
+    Remark: properties added to a class after it has been encoded once
+    are not found.
+    """
+    with _property_names_lock:
+        names = _property_names_cache.get(cls, {}).get(marker_class)
+    if names is not None:
+        return names
+
+    log.debug('> cls=%s', cls.__name__)
+    property_names = []
+    for mro_cls in inspect.getmro(cls):
+        # loop everything the class contains
+        for cls_key, cls_value in mro_cls.__dict__.items():
+            # check the class of the object we found. If the
+            # class is the marker class store the name
+            if cls_value.__class__ == marker_class:
+                # check for duplicated names
+                if cls_key not in property_names:
+                    property_names.append(cls_key)
+    names = tuple(property_names)
+
+    with _property_names_lock:
+        _property_names_cache.setdefault(cls, {})[marker_class] = names
+    log.debug('< names=%s', names)
+    return names
+
+class JSONStream(list):
+    """ An iterable encoded as JSON array without building the list
+
+    The elements are read from "iterable" while the JSON is encoded; used
+    with "jsonify_iter" they are never held in memory at the same time.
+    An iterator (generator) can be encoded only once.
+
+    Example:
+    --------
+    jsonify_iter({'squares': JSONStream(i*i for i in range(10**6))})
+    """
+
+    def __init__(self, iterable):
+        list.__init__(self)
+        self._iterator = iter(iterable)
+        self._head = []
+
+    def __bool__(self):
+        # the encoder checks for an empty list first - read the first element
+        if not self._head:
+            for value in self._iterator:
+                self._head.append(value)
+                break
+        return len(self._head) > 0
+
+    def __iter__(self):
+        while self._head:
+            yield self._head.pop()
+        for value in self._iterator:
+            yield value
+
 class JSONEncoder(json.JSONEncoder):
     """ Override default() function
     
@@ -68,24 +139,7 @@ class JSONEncoder(json.JSONEncoder):
 
     def _get_property_names(self,o,marker_class):
         """ get the names of all properties of the object "o" """
-        log.debug('>')
-        property_names = []
-
-        # loop all classes of "o" and receive the property names
-        for cls in inspect.getmro(o.__class__):
-            log.debug('cls=%s' % cls.__name__)
-            # loop everything the class contains
-            for cls_key in cls.__dict__.keys():
-                # check the class of the object we found. If the
-                # class is "jsonproperty" store the name
-                if cls.__dict__[cls_key].__class__ == marker_class:
-                    log.debug('Found property: %s' % cls_key)
-                    # check for duplicated names
-                    if not cls_key in property_names:
-                        # new one found - store it
-                        property_names.append(cls_key)
-        log.debug('<')
-        return property_names;
+        return _get_class_property_names(o.__class__, marker_class)
 
     def _get_dynamic_properties(self,o):
         """ get all collections marked with "jsoncollection" """
@@ -113,6 +167,16 @@ class JSONEncoder(json.JSONEncoder):
         """
         log.debug('>default')
 
+        # fast path for numpy arrays and scalars - without importing numpy.
+        # Arrays of dates are converted into ISO strings
+        if hasattr(o, 'dtype') and hasattr(o, 'tolist'):
+            if o.dtype.kind == 'M':
+                return o.astype(str).tolist()
+            return o.tolist()
+        # date + time objects
+        if hasattr(o, 'isoformat'):
+            return o.isoformat()
+
         # check for properties; start with an empty dict; add dynamic an static @jsonproperty objects to the dict
         property_dict = dict()
 
@@ -130,7 +194,7 @@ class JSONEncoder(json.JSONEncoder):
             # only include the property, if the flag "include_none" has been
             # set in the constructor of the encode class.
             value = o.__getattribute__(property_name)
-            log.debug('getting value for property:%s value=%s' % (property_name,value) )
+            log.debug('getting value for property:%s value=%s', property_name, value)
             if (self._include_none_values == True) or (value != None):
                 # date + time objects     
                 if hasattr(value, 'isoformat'):
@@ -150,3 +214,68 @@ def jsonify(source,indent=None):
     encoder = JSONEncoder(indent=indent)
     return encoder.encode(source)
 
+# ----------------------------------------------------------------------------
+# number of elements of a numpy array encoded at once by "jsonify_iter"
+ARRAY_SLICE_SIZE = 4096
+
+def _iterencode_stream(encoder, o):
+    """ Encode "o" as iterator of strings; see "jsonify_iter" """
+    if isinstance(o, dict):
+        yield '{'
+        first = True
+        for key, value in o.items():
+            if not first:
+                yield ', '
+            first = False
+            yield encoder.encode(key if isinstance(key, str) else encoder.encode(key))
+            yield ': '
+            yield from _iterencode_stream(encoder, value)
+        yield '}'
+    elif isinstance(o, JSONStream):
+        yield '['
+        first = True
+        for value in o:
+            if not first:
+                yield ', '
+            first = False
+            yield from _iterencode_stream(encoder, value)
+        yield ']'
+    elif o is None or isinstance(o, (str, int, float, list, tuple)):
+        yield encoder.encode(o)
+    elif hasattr(o, 'dtype') and getattr(o, 'ndim', 0) > 0:
+        # numpy arrays: encode slices; strip the brackets of the slices
+        yield '['
+        for start in range(0, len(o), ARRAY_SLICE_SIZE):
+            if start > 0:
+                yield ', '
+            yield encoder.encode(o[start:start + ARRAY_SLICE_SIZE])[1:-1]
+        yield ']'
+    else:
+        yield from _iterencode_stream(encoder, encoder.default(o))
+
+def jsonify_iter(source,indent=None,chunk_size=16*1024):
+    """ Create json from given object - as iterator of strings
+
+    The document is encoded while it is read: the strings can be sent as
+    soon as they are available (e.g. as body of a streaming response).
+    The small pieces of the encoder are joined into strings of about
+    "chunk_size" characters.
+
+    Without "indent", the dicts, objects and "JSONStream"s of the document
+    are walked in Python; all other values (strings, numbers, lists and
+    slices of numpy arrays) are encoded by the C implementation of the
+    encoder. With "indent", the (slower) pure Python encoder is used.
+    """
+    if source is None:
+        return
+    encoder = JSONEncoder(indent=indent)
+    pieces, size = [], 0
+    for piece in (encoder.iterencode(source) if indent is not None else _iterencode_stream(encoder, source)):
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(pieces)
+            pieces, size = [], 0
+    if pieces:
+        yield ''.join(pieces)
+
@@ -27,7 +27,7 @@ class JSONLink(object):
 
     def __init__(self, href, templated=None, type=None, deprecation=None, name=None, profile=None, title=None, hreflang=None):
         """ Create new JSON Link object """
-        log.debug('> href=%s' % href)
+        log.debug('> href=%s', href)
 
         self._href,self._templated,self._type,self._deprecation, self._name, self._profile, self._title, self._hreflang = (href,templated,type,deprecation,name,profile,title,hreflang)
         log.debug('<')
@@ -3,10 +3,38 @@ import os
 import logging
 import json
 import re
+import functools
+import threading
 from collections import namedtuple
 
 log = logging.getLogger(__name__)
 
+# number of namedtuple classes kept for the key tuples of the converted dicts
+TUPLE_CLASSES = 1024
+
+# ---------------------------------------------------------------------------
+@functools.lru_cache(maxsize=TUPLE_CLASSES)
+def _get_tuple_class(keys):
+    """ Get the namedtuple class for the tuple of keys; None if the keys are no valid names
+
+    Creating a class is expensive - all dicts with the same keys share one class.
+    """
+    # try to create a new namedtuple class. It will fail, if the dict contains names like "a.b" or "__name"
+    try:
+        return namedtuple('config', keys)
+    except ValueError:
+        log.info('Cant create TupleClass - using dict')
+        return None
+
+# ---------------------------------------------------------------------------
+def _dict_to_object(item):
+    """ Convert a dict into a namedtuple; the values must be converted already """
+    TupleClass = _get_tuple_class(tuple(item))
+    if TupleClass is None:
+        # we cant create a named tuple - so: return the dict
+        return item
+    return TupleClass(*item.values())
+
 # ---------------------------------------------------------------------------
 def _collection_to_object(item):
     """
@@ -14,38 +42,213 @@ def _collection_to_object(item):
     """
     def convert(item): 
         if isinstance(item, dict):
-            # try to create a new namedtuple class. It will fail, if the dict contains names like "a.b" or "__name"
-            try:
-                TupleClass = namedtuple('config', [k for k in item])
-                return TupleClass( *[convert(v) for v in item.values()] )
-            except ValueError:
-                # we cant create a named tuple - so: return a dict but convert all contains elements
-                log.info('Cant create TupleClass - using dict')
-                return {k:convert(v) for k,v in item.items()} 
-
+            return _dict_to_object({k:convert(v) for k,v in item.items()})
         if isinstance(item, list):
             # list: return a list; convert all elements in the list
-            def yield_convert(item):
-                for index, value in enumerate(item):
-                    yield convert(value)
-            return list(yield_convert(item))
+            return [convert(value) for value in item]
         return item
 
     return convert(item)
 
+# ---------------------------------------------------------------------------
+def _lazy(item):
+    """ Wrap dicts and lists for the lazy conversion """
+    if isinstance(item, dict):
+        return JSONObject(item)
+    if isinstance(item, list):
+        return JSONArray(item)
+    return item
+
+class JSONObject(object):
+    """ A JSON object converted on access - see "json_to_object(lazy=True)"
+
+    The members are read as attributes; nested objects and arrays are
+    wrapped when they are read. Members that are no valid Python names
+    can be read with "getattr". 
+    """
+    __slots__ = ('_item', '_members')
+
+    def __init__(self, item):
+        self._item = item
+        self._members = {}
+
+    def __getattr__(self, name):
+        try:
+            return self._members[name]
+        except KeyError:
+            pass
+        try:
+            value = _lazy(self._item[name])
+        except KeyError:
+            raise AttributeError(name)
+        self._members[name] = value
+        return value
+
+    def __dir__(self):
+        return list(self._item)
+
+    def __repr__(self):
+        return 'JSONObject(%r)' % self._item
+
+class JSONArray(list):
+    """ A JSON array converted on access - see "json_to_object(lazy=True)" """
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ _lazy(value) for value in list.__getitem__(self, index) ]
+        return _lazy(list.__getitem__(self, index))
+
+    def __iter__(self):
+        for value in list.__iter__(self):
+            yield _lazy(value)
+
+# ---------------------------------------------------------------------------
+_split_pattern = re.compile(r'\.|\]|\[')
+_expression_pattern = re.compile(r'@([^=]+)\W*={0,1}\W*([^""]+){0,1}\W*')
+
+# number of lists indexed by one [@key=value] step of a JSONPath
+INDEXED_LISTS = 16
+
 # ---------------------------------------------------------------------------
 def _split_json_path(json_path):
     """ Split a string into tokens that we can use to read as properties """
-    return list(filter(lambda tok: len(tok)>0,re.split('\.|\]|\[',json_path)))
+    return [tok for tok in _split_pattern.split(json_path) if len(tok)>0]
 # ---------------------------------------------------------------------------
 def _get_expression(index_str):
-    c = re.compile('@([^=]+)\W*={0,1}\W*([^""]+){0,1}\W*')
-    x = c.match(index_str)
+    x = _expression_pattern.match(index_str)
     # check. We must have one or two matches...
     if x is None:
         raise IndexError('Invalid expression in array index:%s' % index_str)
     return (x.groups()[0],x.groups()[1])
 
+# ---------------------------------------------------------------------------
+class _PathStep(object):
+    """ One token of a JSONPath """
+
+    def __init__(self, tok, index):
+        self.tok = tok
+        self.list_index = int(tok) if tok.isdigit() else None
+        # the expression is only used, if the token is applied to a list
+        self.expression_error = None
+        self.attr_path, self.attr_value = None, None
+        if self.list_index is None:
+            try:
+                attrname, self.attr_value = _get_expression(tok)
+                self.attr_path = JSONPath(attrname)
+            except IndexError as ixErr:
+                self.expression_error = ixErr
+        # index of the lists: id(list) --> (list, {attribute value: element});
+        # the path may be shared by threads
+        self._indexed = {} if index else None
+        self._lock = threading.Lock()
+
+    def filter(self, json_object_list):
+        """ Find the first element of the list matching the expression """
+        if self.expression_error is not None:
+            raise self.expression_error
+        if self._indexed is None or self.attr_value is None:
+            return _filter_key_value(json_object_list, self.attr_path, self.attr_value)
+
+        with self._lock:
+            entry = self._indexed.get(id(json_object_list))
+        if entry is None or entry[0] is not json_object_list:
+            # build the index outside the lock; two threads may build the same index
+            entry = (json_object_list, self._build_index(json_object_list))
+            with self._lock:
+                if len(self._indexed) >= INDEXED_LISTS and id(json_object_list) not in self._indexed:
+                    self._indexed.pop(next(iter(self._indexed)))
+                self._indexed[id(json_object_list)] = entry
+        return entry[1].get(self.attr_value)
+
+    def _build_index(self, json_object_list):
+        """ Map the attribute values to the first element with the value """
+        index = {}
+        for json_object in json_object_list:
+            try:
+                json_attr = self.attr_path.get(json_object)
+                if json_attr not in index:
+                    index[json_attr] = json_object
+            except (IndexError, KeyError, TypeError):
+                # no attribute - or the value can not be used as key
+                pass
+        return index
+
+# ---------------------------------------------------------------------------
+class JSONPath(object):
+    """ Compiled path to read values from JSON objects
+
+    Use "compile_json_path()" to create it. The path is split and the
+    expressions in array indexes are parsed only once.
+
+    If "index" is set, the [@key="value"] expressions build an index
+    for the lists they are applied to; repeated lookups in the same list
+    are dict lookups. The index assumes that the lists are not changed.
+    A compiled path can be shared by threads.
+    """
+
+    def __init__(self, json_path, index=False):
+        self.json_path = json_path
+        self._steps = [ _PathStep(tok, index) for tok in _split_json_path(json_path) ]
+
+    def get(self, o):
+        """ Read the value from the object "o" """
+        # setup the "current" element we are checking against
+        current = o
+        # loop all tokens
+        for step in self._steps:
+            # case 1: the current element is a list: check index
+            if isinstance(current,list):
+                # check index agains current token. Must be 
+                # - a number
+                # - an expression to access a attribute value. Example: @name="Kalle"
+                # - an expression to check if an attribute exits. Example: @name.firstname
+                if step.list_index is None:
+                    # loop the list to find the first matching element
+                    current = step.filter(current)
+                    if current is None:
+                        # no element with given index expression in list
+                        raise IndexError('No matching element for expression:%s' % step.tok)
+                else:
+                    # check position
+                    if step.list_index>=len(current):
+                        raise IndexError('Invalid index:%s' % step.tok)
+                    # the element at the given index becomes the next "current"
+                    current=current[step.list_index]
+            elif isinstance(current,dict):
+                # the JSON did contain elements (like "my-age":42) that can not be converted into attributes of a named-tuple.
+                # so, we had to use a dict here...
+                current = current.get(step.tok)
+                if current is None:
+                    raise KeyError('Invalid key for dict:%s' % step.tok)
+            else:
+                # case 2: the current element is an object: check element name
+                # check if the object contains the element with the name "tok"
+                if hasattr(current,step.tok)==False:
+                    raise KeyError('Invalid key:%s' % step.tok)
+                # get the value at the given key - it becomes the next "current"
+                current = getattr(current,step.tok)
+        return current
+
+    def __repr__(self):
+        return 'JSONPath(%r)' % self.json_path
+
+# ---------------------------------------------------------------------------
+def compile_json_path(json_path, index=False):
+    """ Compile a path for "get_json_attribute" into a reusable JSONPath
+
+    Example:
+
+    street = compile_json_path('adr.street')
+    street.get(person)
+    """
+    return JSONPath(json_path, index)
+
+# ---------------------------------------------------------------------------
+@functools.lru_cache(maxsize=256)
+def _compile_cached(json_path):
+    """ Compiled paths of the string-based functions """
+    return JSONPath(json_path)
+
 # ---------------------------------------------------------------------------
 def _get_json_attribute_from_object(o,json_path):
     """ Read a value from a JSON string or a JSON object.
@@ -56,47 +259,9 @@ def _get_json_attribute_from_object(o,json_path):
     _get_json_attribute('{"name":"Kalle","adr":{"city":"Worms","street":"Main"}}, "adr.street")
     ...will return "Main"
     """
-    # split the json_path
-    tokens = _split_json_path(json_path)
-    # setup the "current" element we are checking against
-    current = o
-    # loop all tokens
-    for tok in tokens:
-        # case 1: the current element is a list: check index
-        if isinstance(current,list):
-            # check index agains current token. Must be 
-            # - a number
-            # - an expression to access a attribute value. Example: @name="Kalle"
-            # - an expression to check if an attribute exits. Example: @name.firstname
-            if tok.isdigit()==False:
-                # get the expression: attrname,attrvalue
-                attrname,attrvalue = _get_expression(tok)
-                # loop the list to find the first matching element
-                current = _filter_key_value(current, attrname, attrvalue)
-                if current is None:
-                    # no element with given index expression in list
-                    raise IndexError('No matching element for expression:%s' % tok)
-            else:
-                list_index = int(tok)
-                # check position
-                if (list_index<0) or (list_index>len(current)):
-                    raise IndexError('Invalid index:%s' % tok)
-                # the element at the given index becomes the next "current"
-                current=current[list_index]
-        elif isinstance(current,dict):
-            # the JSON did contain elements (like "my-age":42) that can not be converted into attributes of a named-tuple.
-            # so, we had to use a dict here...
-            current = current.get(tok)
-            if current is None:
-                raise KeyError('Invalid key for dict:%s' % tok)
-        else:
-            # case 2: the current element is a dict: check element name
-            # check if the dict contains the element with the name "tok"
-            if hasattr(current,tok)==False:
-                raise KeyError('Invalid key:%s' % tok)
-            # get the value at the given key - it becomes the next "current"
-            current = getattr(current,tok)
-    return current
+    if isinstance(json_path, JSONPath):
+        return json_path.get(o)
+    return _compile_cached(json_path).get(o)
 # ---------------------------------------------------------------------------
 def _filter_key_value(json_object_list,key,value=None):
     """ Find an element with a matching attribute within a collection 
@@ -139,6 +304,7 @@ def get_json_attribute(obj_or_string, json_path=None):
     person.name[@firstname] --> access an object inside an array which has a attribute "firstname"
     person.name[@firstname="Kalle"] --> access an object inside an array by property value
 
+    "json_path" may be a string or a path compiled with "compile_json_path()".
     """
     # check type
     if isinstance(obj_or_string,str):
@@ -151,8 +317,18 @@ def get_json_attribute(obj_or_string, json_path=None):
         return _get_json_attribute_from_object(obj_or_string, json_path)
 
 # ---------------------------------------------------------------------------
-def json_to_object(json_string):
+def json_to_object(json_string, lazy=False):
     """ Convert a JSON string to an object
+
+    The JSON objects are converted into namedtuples - or into dicts, if
+    the names of the members are no valid Python names.
+
+    If "lazy" is set, the nested objects and arrays are converted when
+    they are read (see JSONObject). Use it for large documents of which
+    only some members are read.
     """
-    return _collection_to_object(json.loads(json_string))
+    if lazy:
+        return _lazy(json.loads(json_string))
+    # the objects are converted by the decoder - innermost first
+    return json.loads(json_string, object_hook=_dict_to_object)
 
@@ -1,8 +1,31 @@
 # service utilities
+import os
 import logging
+from kool import get_json_attribute
+
 log = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
 def get_numeric_loglevel(loglevel_string):
     return {'NOTSET':0,'DEBUG':10,'INFO':20,'WARNING':30,'ERROR':40,'CRITICAL':50}[loglevel_string]
 
+
+# ---------------------------------------------------------------------------
+def get_config_value(config, json_path, default=None):
+    """ Read a value from the (optional) configuration object
+
+    Returns "default", if there is no configuration or the value is not set.
+    """
+    if config is None:
+        return default
+    try:
+        return get_json_attribute(config, json_path)
+    except (KeyError, IndexError):
+        return default
+
+# ---------------------------------------------------------------------------
+def get_app_config():
+    """ Read the (optional) application configuration from the environment variable "APP_CONFIG" """
+    if os.getenv("APP_CONFIG") is None:
+        return None
+    return get_json_attribute(os.getenv("APP_CONFIG"))
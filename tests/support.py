@@ -0,0 +1,48 @@
+# helpers of the tests
+#
+# The modules of the application are in "py"; they are imported from there.
+# "covid19_main" configures the application on import - "import_main()"
+# sets up the environment with a local CSV file first.
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'py'))
+
+HEADER = 'Date,Country/Region,Province/State,Lat,Long,Confirmed,Recovered,Deaths\n'
+COUNTRIES = ('Germany', 'Italy', 'France')
+
+# the data file of the application imported by "import_main()"
+DATA_FILE = os.path.join(tempfile.mkdtemp(prefix='covid19_test_'), 'combined.csv')
+
+# ---------------------------------------------------------------------------
+def csv_rows(days=60, countries=COUNTRIES, end=None):
+    """ Create the rows of a combined CSV file: one row per country and day until "end" (default: today) """
+    end = end or date.today()
+    rows = []
+    for offset in range(days - 1, -1, -1):
+        day = end - timedelta(days=offset)
+        for ix, country in enumerate(countries):
+            confirmed = (ix + 1) * 100 * (days - offset)
+            rows.append('%s,%s,,0.0,0.0,%d,%d,%d\n' % (day.isoformat(), country, confirmed, confirmed // 2, confirmed // 50))
+    return rows
+
+def write_csv(path, rows):
+    """ Write the file; readers never see a partly written file """
+    with open(path + '.tmp', 'w') as f:
+        f.write(HEADER + ''.join(rows))
+    os.replace(path + '.tmp', path)
+
+# ---------------------------------------------------------------------------
+def import_main():
+    """ Import the application; it reads DATA_FILE (Dataset.Source=local)
+
+    The TTL is 0: "dataset_store.refresh()" reads a changed file at once.
+    """
+    if 'covid19_main' not in sys.modules:
+        write_csv(DATA_FILE, csv_rows())
+        os.environ['LOG_CONFIG'] = '{"Level":{"Default":"WARNING","Main":"WARNING"},"Format":"%(levelname)s %(name)s %(message)s"}'
+        os.environ['APP_CONFIG'] = '{"Dataset":{"Source":"local","Path":"%s","TTL":0}}' % DATA_FILE
+    import covid19_main
+    return covid19_main
@@ -0,0 +1,34 @@
+# REST API: paging of the countries
+import unittest
+
+from tests import support
+
+main = support.import_main()
+
+class ApiCountriesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = main.application.test_client()
+        support.write_csv(support.DATA_FILE, support.csv_rows())
+        main.dataset_store.refresh()
+
+    def test_paging(self):
+        response = self.client.get('/api/countries?page=0&size=1')
+        self.assertEqual(response.status_code, 200)
+        document = response.get_json()
+        self.assertEqual(len(document['_embedded']['countries']), 1)
+        self.assertIn('next', document['_links'])
+
+    def test_invalid_paging(self):
+        for query in ('size=0', 'size=-1', 'page=-1', 'page=x', 'size=1.5'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get('/api/countries?' + query).status_code, 400)
+
+    def test_invalid_timespan(self):
+        for url in ('/api/countries/Germany/series?timespan=abc', '/api/series?timespan=1.5'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get('/api/countries/Germany/series?timespan=10').status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
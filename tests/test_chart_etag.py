@@ -0,0 +1,50 @@
+# ETag of the charts: a revision of the data gives a new ETag
+import time
+import unittest
+
+from tests import support
+
+main = support.import_main()
+
+class ChartETagTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = main.application.test_client()
+        support.write_csv(support.DATA_FILE, support.csv_rows())
+        main.dataset_store.refresh()
+
+    def get(self, url, etag=None):
+        return self.client.get(url, headers={'If-None-Match': etag} if etag else {})
+
+    def test_not_modified(self):
+        response = self.get('/chart/focus.png?country=Germany')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get('/chart/focus.png?country=Germany', response.headers['ETag']).status_code, 304)
+
+    def test_revision(self):
+        url = '/chart/focus.json?country=Germany&timespan=10'
+        response = self.get(url)
+        version = main.dataset_store.version
+
+        # correct the number of the last day: same rows, same last date
+        rows = support.csv_rows()
+        fields = rows[-3].split(',')
+        fields[5] = str(int(fields[5]) + 1000)
+        rows[-3] = ','.join(fields)
+        time.sleep(0.01)
+        support.write_csv(support.DATA_FILE, rows)
+        main.dataset_store.refresh()
+
+        self.assertNotEqual(main.dataset_store.version, version)
+        revised = self.get(url, response.headers['ETag'])
+        self.assertEqual(revised.status_code, 200)
+        self.assertNotEqual(revised.headers['ETag'], response.headers['ETag'])
+        self.assertEqual(revised.get_json()['lines'][0][-1], response.get_json()['lines'][0][-1] + 1000)
+
+    def test_invalid_timespan(self):
+        for url in ('/chart/total.png?country=Germany&timespan=abc', '/?country=Germany&timespan=abc'):
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url).status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+# HTTP fetcher: pooling, retries, timeouts and single-flight against a local server
+import asyncio
+import http.server
+import socket
+import socketserver
+import threading
+import time
+import unittest
+
+from tests import support # path of the application modules
+import covid19_fetch
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """ Answers of the paths; counts the requests per path and the client ports """
+    protocol_version = 'HTTP/1.1'
+    hits, ports = {}, set()
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body=b''):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        self.hits[path] = self.hits.get(path, 0) + 1
+        self.ports.add(self.client_address[1])
+        if path == '/flaky':
+            # 503 for the first two requests
+            self.send(503 if self.hits[path] <= 2 else 200, b'ok')
+        elif path == '/down':
+            self.send(503, b'down')
+        elif path == '/missing':
+            self.send(404, b'missing')
+        elif path == '/slow':
+            # the header comes late
+            time.sleep(3)
+            self.send(200, b'late')
+        elif path == '/trickle':
+            # the body comes one byte every 0.1s
+            self.send_response(200)
+            self.send_header('Content-Length', '100')
+            self.end_headers()
+            for _ in range(100):
+                self.wfile.write(b'x')
+                self.wfile.flush()
+                time.sleep(0.1)
+        elif path == '/shared':
+            time.sleep(0.5)
+            self.send(200, b'shared')
+        else:
+            self.send(200, b'data')
+
+class StubServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+class HttpFetcherTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = 'http://127.0.0.1:%d' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubHandler.hits.clear()
+        StubHandler.ports.clear()
+        self.fetcher = covid19_fetch.HttpFetcher(connect_timeout=1, read_timeout=1, retries=2, backoff=0.01, deadline=5)
+
+    def tearDown(self):
+        self.fetcher.close()
+
+    def test_pooling(self):
+        for _ in range(3):
+            self.assertEqual(self.fetcher.fetch_bytes(self.base + '/data'), b'data')
+        # one connection for all requests
+        self.assertEqual(len(StubHandler.ports), 1)
+
+    def test_retry(self):
+        self.assertEqual(self.fetcher.fetch_bytes(self.base + '/flaky'), b'ok')
+        self.assertEqual(StubHandler.hits['/flaky'], 3)
+
+    def test_retries_exhausted(self):
+        with self.assertRaises(covid19_fetch.FetchError) as context:
+            self.fetcher.fetch_bytes(self.base + '/down')
+        self.assertEqual(context.exception.status, 503)
+        self.assertEqual(StubHandler.hits['/down'], 3)
+
+    def test_no_retry(self):
+        with self.assertRaises(covid19_fetch.FetchError) as context:
+            self.fetcher.fetch_bytes(self.base + '/missing')
+        self.assertEqual(context.exception.status, 404)
+        self.assertEqual(StubHandler.hits['/missing'], 1)
+
+    def test_read_timeout(self):
+        fetcher = covid19_fetch.HttpFetcher(read_timeout=0.2, retries=0)
+        started = time.monotonic()
+        with self.assertRaises(socket.timeout):
+            fetcher.fetch_bytes(self.base + '/slow')
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_deadline_stalled_body(self):
+        # every byte comes within the read timeout - the deadline stops the download
+        fetcher = covid19_fetch.HttpFetcher(read_timeout=1, deadline=0.5)
+        started = time.monotonic()
+        with self.assertRaises(socket.timeout):
+            fetcher.fetch_bytes(self.base + '/trickle')
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_load_deadline(self):
+        # the deadline of the load is shorter than the timeouts of the fetcher
+        started = time.monotonic()
+        with self.assertRaises(socket.timeout):
+            with covid19_fetch.load_deadline(0.3):
+                self.fetcher.fetch_bytes(self.base + '/slow')
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_async_load_deadline(self):
+        # the deadline of the calling coroutine applies in the thread of the executor
+        async def fetch():
+            with covid19_fetch.load_deadline(0.3):
+                return await covid19_fetch.fetch_bytes_async(self.fetcher, self.base + '/slow')
+        loop = asyncio.new_event_loop()
+        started = time.monotonic()
+        try:
+            with self.assertRaises(socket.timeout):
+                loop.run_until_complete(fetch())
+        finally:
+            loop.close()
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_async(self):
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(covid19_fetch.fetch_bytes_async(self.fetcher, self.base + '/data')), b'data')
+        finally:
+            loop.close()
+
+    def test_single_flight(self):
+        results = [None] * 5
+        def fetch(ix):
+            results[ix] = self.fetcher.fetch_bytes(self.base + '/shared')
+        threads = [threading.Thread(target=fetch, args=(ix,)) for ix in range(len(results))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [b'shared'] * len(results))
+        self.assertEqual(StubHandler.hits['/shared'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
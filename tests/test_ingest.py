@@ -0,0 +1,160 @@
+# incremental ingest of the CSV file: a local HTTP server serves a growing file
+import gzip
+import hashlib
+import http.server
+import os
+import socketserver
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from tests import support
+import covid19_ingest
+import covid19_snapshot
+import covid19_table
+
+class GrowingFileHandler(http.server.BaseHTTPRequestHandler):
+    """ Serve the files of "directory" with ETag, ranges ("ranges") and gzip ("gzip") """
+    directory, ranges, gzip = None, True, False
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with open(os.path.join(self.directory, self.path.lstrip('/')), 'rb') as f:
+            data = f.read()
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        self.requests.append((self.headers.get('Range'), self.headers.get('Accept-Encoding')))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        range_header = self.headers.get('Range')
+        if range_header and self.ranges:
+            start = int(range_header.split('=')[1].rstrip('-'))
+            if start >= len(data):
+                self.send_response(416)
+                self.end_headers()
+                return
+            body = data[start:]
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(data) - 1, len(data)))
+        else:
+            body = data
+            self.send_response(200)
+            if self.gzip and 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+                body = gzip.compress(data)
+                self.send_header('Content-Encoding', 'gzip')
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes' if self.ranges else 'none')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+class CsvIngestTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        GrowingFileHandler.directory = tempfile.mkdtemp(prefix='covid19_ingest_')
+        cls.server = ThreadingServer(('127.0.0.1', 0), GrowingFileHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = 'http://127.0.0.1:%d/combined.csv' % cls.server.server_address[1]
+        cls.path = os.path.join(GrowingFileHandler.directory, 'combined.csv')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        del GrowingFileHandler.requests[:]
+        # rows sorted by date: the file grows at the end
+        self.rows = support.csv_rows(days=40)
+
+    def write_days(self, days):
+        support.write_csv(self.path, self.rows[:days * len(support.COUNTRIES)])
+
+    def assertFullParse(self, table):
+        """ The table equals the table parsed from the whole file """
+        with open(self.path) as f:
+            reference = covid19_table.CovidTable.from_csv(f.read().splitlines(True))
+        self.assertEqual(table.country_names, reference.country_names)
+        self.assertTrue(np.array_equal(table.days, reference.days))
+        for name in ('confirmed', 'recovered', 'deaths'):
+            self.assertTrue(np.array_equal(table.matrix(name), reference.matrix(name)), name)
+        self.assertEqual(table.version, reference.version)
+
+    def grow(self, ingest, correct_last_day=True):
+        """ Read the file while it grows; every table must match a full parse
+
+        A file read with ranges ("append_only") only grows - the last day is
+        not corrected.
+        """
+        self.write_days(30)
+        table = ingest.load(None)
+        self.assertFullParse(table)
+        # not modified
+        self.assertIs(ingest.load(table), table)
+        for days in (31, 32, 36, 40):
+            self.write_days(days)
+            table = ingest.load(table)
+            self.assertFullParse(table)
+        if not correct_last_day:
+            return table
+        # a correction of the last day
+        self.rows[-1] = self.rows[-1].replace(',0.0,0.0,', ',0.0,0.0,1', 1)
+        self.write_days(40)
+        table = ingest.load(table)
+        self.assertFullParse(table)
+        return table
+
+    def test_plain(self):
+        GrowingFileHandler.ranges, GrowingFileHandler.gzip = False, False
+        table = self.grow(covid19_ingest.CsvIngest(self.url, chunk_size=1024))
+        self.assertFalse(any(requested_range for requested_range, _ in GrowingFileHandler.requests))
+        # the confirmed cases of the last country and day are prefixed by "1"
+        last = table.country_names.index(support.COUNTRIES[-1])
+        self.assertEqual(table.matrix('confirmed')[last, -1], int('1%d' % (len(support.COUNTRIES) * 100 * 40)))
+
+    def test_gzip(self):
+        GrowingFileHandler.ranges, GrowingFileHandler.gzip = False, True
+        self.grow(covid19_ingest.CsvIngest(self.url, chunk_size=1024))
+        self.assertTrue(all('gzip' in (encoding or '') for _, encoding in GrowingFileHandler.requests))
+
+    def test_range(self):
+        GrowingFileHandler.ranges, GrowingFileHandler.gzip = True, False
+        self.grow(covid19_ingest.CsvIngest(self.url, chunk_size=1024, append_only=True), correct_last_day=False)
+        self.assertTrue(any(requested_range for requested_range, _ in GrowingFileHandler.requests))
+
+    def test_snapshot_of_other_worker(self):
+        # two workers share the snapshot; the file grows by one day between the reads
+        GrowingFileHandler.ranges, GrowingFileHandler.gzip = True, False
+        directory = tempfile.mkdtemp(prefix='covid19_snapshot_')
+        ingest_a = covid19_ingest.CsvIngest(self.url, chunk_size=1024, append_only=True)
+        ingest_b = covid19_ingest.CsvIngest(self.url, chunk_size=1024, append_only=True)
+        # worker A uses a fresh snapshot; with an expired one it reads the data source
+        fresh_a = covid19_snapshot.SnapshotLoader(ingest_a, directory, max_age=3600)
+        expired_a = covid19_snapshot.SnapshotLoader(ingest_a, directory, max_age=0)
+        expired_b = covid19_snapshot.SnapshotLoader(ingest_b, directory, max_age=0)
+
+        self.write_days(30)
+        table_a, _ = expired_a(None)
+        # worker B writes the snapshot of the next day; A takes it over
+        self.write_days(31)
+        expired_b(None)
+        table_a, _ = fresh_a(table_a)
+        self.assertFullParse(table_a)
+        # A reads the next day: its checkpoint of day 30 must not be used
+        self.write_days(32)
+        table_a, _ = expired_a(table_a)
+        self.assertFullParse(table_a)
+
+if __name__ == '__main__':
+    unittest.main()
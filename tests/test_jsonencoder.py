@@ -0,0 +1,55 @@
+# kool JSON encoder: the properties found over the class hierarchy
+import json
+import unittest
+
+from tests import support # path of the application modules
+from kool.jsonencoder import JSONEncoder, jsonproperty, jsoncollection
+
+class Base(object):
+
+    @jsonproperty
+    def name(self):
+        return 'base'
+
+    @jsonproperty
+    def value(self):
+        return 'coll'
+
+class Plain(Base):
+
+    @property
+    def value(self):
+        return 'plain'
+
+class Renamed(Base):
+
+    @jsonproperty
+    def name(self):
+        return 'renamed'
+
+class Items(object):
+
+    @jsoncollection
+    def items(self):
+        return {'count': 2}
+
+class JSONEncoderTest(unittest.TestCase):
+
+    def encode(self, o):
+        return json.loads(JSONEncoder().encode(o))
+
+    def test_base_property_overridden_by_plain_property(self):
+        # the name is marked in a base class: the value comes from the subclass
+        self.assertEqual(self.encode(Plain()), {'name': 'base', 'value': 'plain'})
+        # cached names give the same result
+        self.assertEqual(self.encode(Plain()), {'name': 'base', 'value': 'plain'})
+
+    def test_overridden_property(self):
+        self.assertEqual(self.encode(Renamed()), {'name': 'renamed', 'value': 'coll'})
+        self.assertEqual(self.encode(Base()), {'name': 'base', 'value': 'coll'})
+
+    def test_collection(self):
+        self.assertEqual(self.encode(Items()), {'count': 2})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# kool JSON reader: compiled paths with an index
+import sys
+import threading
+import unittest
+
+from tests import support # path of the application modules
+from kool import json_to_object
+from kool.jsonreader import compile_json_path, INDEXED_LISTS
+
+class JSONPathTest(unittest.TestCase):
+
+    def test_index(self):
+        path = compile_json_path('countries[@name=Italy].population', index=True)
+        document = json_to_object('{"countries":[{"name":"Germany","population":83},{"name":"Italy","population":60}]}')
+        self.assertEqual(path.get(document), 60)
+        self.assertEqual(path.get(document), 60)
+
+    def test_index_threads(self):
+        # one compiled path shared by threads; more lists than indexed lists: the index evicts lists
+        path = compile_json_path('items[@name=n3].value', index=True)
+        documents = [ json_to_object('{"items":[%s]}' % ','.join('{"name":"n%d","value":%d}' % (ix, ix * doc) for ix in range(5)))
+                      for doc in range(INDEXED_LISTS * 4) ]
+        errors = []
+        def lookup():
+            try:
+                for _ in range(200):
+                    for doc, document in enumerate(documents):
+                        if path.get(document) != 3 * doc:
+                            errors.append('wrong value')
+            except Exception as e:
+                errors.append(repr(e))
+        threads = [ threading.Thread(target=lookup) for _ in range(8) ]
+        # switch the threads often
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+
+if __name__ == '__main__':
+    unittest.main()
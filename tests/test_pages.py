@@ -0,0 +1,34 @@
+# main page: cached and counted by the name of the country in the table
+import unittest
+
+from tests import support
+import covid19_warmer
+
+main = support.import_main()
+
+class PageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = main.application.test_client()
+        support.write_csv(support.DATA_FILE, support.csv_rows())
+        main.dataset_store.refresh()
+        main.page_cache.clear()
+        self.cache_warmer, main.cache_warmer = main.cache_warmer, covid19_warmer.CacheWarmer(main.warm_page, [], 5)
+
+    def tearDown(self):
+        main.cache_warmer = self.cache_warmer
+
+    def test_country_case(self):
+        pages = [ self.client.get('/?country=%s' % country) for country in ('Germany', 'germany', 'GERMANY') ]
+        self.assertEqual([ page.status_code for page in pages ], [200] * 3)
+        self.assertEqual(pages[1].data, pages[0].data)
+        stats = main.page_cache.stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses']), (1, 2, 1))
+        self.assertEqual(main.cache_warmer.keys(), [('Germany', 30)])
+
+    def test_unknown_country(self):
+        self.assertEqual(self.client.get('/?country=Atlantis').status_code, 200)
+        self.assertEqual(main.cache_warmer.keys(), [])
+
+if __name__ == '__main__':
+    unittest.main()
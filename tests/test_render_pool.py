@@ -0,0 +1,33 @@
+# render pool: the charts rendered by the worker processes
+import unittest
+from datetime import date
+
+import numpy as np
+
+from tests import support # path of the application modules
+import covid19_charts
+import covid19_render_pool
+
+class RenderPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = covid19_render_pool.RenderPool(2)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_render(self):
+        end = np.datetime64(date.today().isoformat(), 'D')
+        registered = np.arange(30, dtype=np.int64) * 100
+        data = { 'date': np.arange(end - 29, end + 1), 'registered': registered, 'ill': registered // 3
+               , 'new_reg': np.full(30, 100, dtype=np.int64), 'dead': registered // 50, 'recovered': registered // 2
+               , 'r': np.ones(30) }
+        kinds = list(covid19_charts.CHARTS)
+        charts = self.pool.render(kinds, data)
+        self.assertEqual(charts, { kind: covid19_charts.render(kind, data) for kind in kinds })
+        # rendered by the pool - not by the fallback in this process
+        self.assertIsNotNone(self.pool._pool)
+
+if __name__ == '__main__':
+    unittest.main()
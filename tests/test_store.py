@@ -0,0 +1,55 @@
+# dataset store: concurrent callers share one load
+import time
+import threading
+import unittest
+
+from tests import support # path of the application modules
+import covid19_store
+
+class DatasetStoreTest(unittest.TestCase):
+
+    def get_concurrently(self, store, callers=5):
+        """ Call "get()" in several threads; returns the results (or exceptions) and the durations """
+        results, durations = [None] * callers, [None] * callers
+        def get(ix):
+            started = time.time()
+            try:
+                results[ix] = store.get()
+            except covid19_store.DatasetUnavailableError as e:
+                results[ix] = e
+            durations[ix] = time.time() - started
+        threads = [ threading.Thread(target=get, args=(ix,)) for ix in range(callers) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, durations
+
+    def test_cold_start_source_down(self):
+        calls = []
+        def loader(previous):
+            calls.append(time.time())
+            time.sleep(0.3)
+            raise IOError('source down')
+        store = covid19_store.DatasetStore(loader, ttl=60, retry_interval=60)
+        results, durations = self.get_concurrently(store)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, covid19_store.DatasetUnavailableError) for result in results))
+        self.assertLess(max(durations), 0.6)
+        # the next request within "retry_interval" fails at once
+        self.assertRaises(covid19_store.DatasetUnavailableError, store.get)
+        self.assertEqual(len(calls), 1)
+
+    def test_cold_start(self):
+        calls = []
+        def loader(previous):
+            calls.append(time.time())
+            time.sleep(0.3)
+            return 'data', 'v1'
+        store = covid19_store.DatasetStore(loader, ttl=60)
+        results, durations = self.get_concurrently(store)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['data'] * 5)
+
+if __name__ == '__main__':
+    unittest.main()